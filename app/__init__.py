@@ -24,8 +24,9 @@ def create_app():
 
     login_manager.login_view = 'routes.login'
 
-    # Initialize caching structure for LLMs, chains, etc.
-    app.config['CACHE'] = {}  # Create an empty dictionary to store reusable objects
+    # Bounded cache of reusable objects (vector stores, retrievers, prompt templates)
+    from .object_cache import ObjectCache
+    app.extensions['object_cache'] = ObjectCache()
 
     with app.app_context():
         db.create_all()
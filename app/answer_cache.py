@@ -0,0 +1,147 @@
+import os
+import time
+import threading
+import numpy as np
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between a new and a cached question to reuse the answer
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.95))
+# Seconds an answer may be reused
+ANSWER_CACHE_TTL = float(os.environ.get("ANSWER_CACHE_TTL", 24 * 3600))
+# Answers kept per collection
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 256))
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _Entry:
+    def __init__(self, question, embedding, answer, source_ids, generation_seconds):
+        self.question = question
+        self.embedding = embedding
+        self.answer = answer
+        self.source_ids = source_ids
+        self.generation_seconds = generation_seconds
+        self.created = time.time()
+        self.last_used = self.created
+
+
+class SemanticAnswerCache:
+    """
+    Reuses RAG answers for near-identical questions.
+
+    Entries are kept per (collection, collection version, embedding model, k). A
+    question whose embedding has a cosine similarity of at least `threshold` with a
+    cached question gets the cached answer and source ids. Entries stored without an
+    embedding (under their own model key) only match the same question text. Entries of older collection
+    versions are dropped on the next lookup, entries older than `ttl` seconds expire,
+    and each collection keeps at most `max_entries` answers (least recently used go first).
+    """
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # collection -> (version, {(model, k): [entries]})
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.saved_seconds = 0.0
+        self.evictions = {"version": 0, "age": 0, "size": 0}
+
+    def _bucket(self, collection, version, model, k):
+        # Caller holds self._lock
+        current = self._entries.get(collection)
+        if current is None or current[0] != version:
+            if current is not None:
+                self.evictions["version"] += sum(len(entries) for entries in current[1].values())
+            current = (version, {})
+            self._entries[collection] = current
+        return current[1].setdefault((model, k), [])
+
+    def lookup(self, collection, version, model, k, embedding, question=None):
+        """
+        Returns the most similar cached entry above the threshold, or None. Without an
+        embedding, only an entry stored for exactly the same question text is returned.
+        """
+        embedding = _normalize(embedding) if embedding is not None else None
+        now = time.time()
+        with self._lock:
+            self.lookups += 1
+            entries = self._bucket(collection, version, model, k)
+            expired = [entry for entry in entries if now - entry.created > self.ttl]
+            for entry in expired:
+                entries.remove(entry)
+            self.evictions["age"] += len(expired)
+            if not entries:
+                return None
+
+            if embedding is None:
+                entry = next((entry for entry in entries if entry.question == question), None)
+                if entry is None:
+                    return None
+            else:
+                similarities = np.stack([entry.embedding for entry in entries]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] < self.threshold:
+                    return None
+                entry = entries[best]
+            entry.last_used = now
+            self.hits += 1
+            self.saved_seconds += entry.generation_seconds
+            return entry
+
+    def store(self, collection, version, model, k, question, embedding, answer, source_ids, generation_seconds):
+        with self._lock:
+            entries = self._bucket(collection, version, model, k)
+            embedding = _normalize(embedding) if embedding is not None else None
+            entries.append(_Entry(question, embedding, answer, list(source_ids), generation_seconds))
+            size = sum(len(bucket) for bucket in self._entries[collection][1].values())
+            while size > self.max_entries:
+                bucket = min(
+                    (bucket for bucket in self._entries[collection][1].values() if bucket),
+                    key=lambda bucket: min(entry.last_used for entry in bucket),
+                )
+                bucket.remove(min(bucket, key=lambda entry: entry.last_used))
+                self.evictions["size"] += 1
+                size -= 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": {
+                    collection: sum(len(bucket) for bucket in buckets.values())
+                    for collection, (_, buckets) in self._entries.items()
+                },
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_ratio": round(self.hits / self.lookups, 4) if self.lookups else None,
+                "saved_llm_seconds": round(self.saved_seconds, 2),
+                "evictions": dict(self.evictions),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """
+    Returns the process-wide answer cache, or None if ANSWER_CACHE_ENABLED is false.
+    """
+    global _cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SemanticAnswerCache()
+    return _cache
@@ -1,48 +1,284 @@
+import os
+import time
+import uuid
+import threading
 from chromadb.config import Settings
 from chromadb import Client
-from chromadb import PersistentClient
+from chromadb import PersistentClient, HttpClient
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from flask import current_app
+from langchain_core.embeddings import Embeddings
+from app.object_cache import get_object_cache
+from app.vectorizer import (
+    MULTILINGUAL_MODEL_NAME,
+    ENGLISH_MODEL_NAME,
+    vectorize_text,
+    vectorize_texts,
+    vectorize_sources,
+    vectorize_sources_batch,
+    pooling_for,
+    DEFAULT_POOLING,
+)
+from app.retrieval import HybridRetriever
+from app.reranker import RERANK_ENABLED, RERANK_CANDIDATES
+from app.lexical_index import get_lexical_index
+from app.document_store import get_document_store
 
 
 
 path = "./chroma_data"
+# Host and port of a shared Chroma server (see run_chroma_server.py); empty uses ./chroma_data directly
+CHROMA_SERVER_HOST = os.environ.get("CHROMA_SERVER_HOST", "")
+CHROMA_SERVER_PORT = int(os.environ.get("CHROMA_SERVER_PORT", 8000))
+
+
+def _token_file(name):
+    return os.path.join(path, "versions", name)
+
+
+def _write_token(name):
+    os.makedirs(os.path.dirname(_token_file(name)), exist_ok=True)
+    temporary = f"{_token_file(name)}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(f"{time.time_ns()}-{uuid.uuid4().hex[:8]}")
+    os.replace(temporary, _token_file(name))
+
+
+def _read_token(name):
+    try:
+        with open(_token_file(name)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return "initial"
+
+
+class ChromaClientManager:
+    """
+    Holds one Chroma client per process and caches collection handles.
+
+    The client is created lazily and recreated after a fork (e.g. gunicorn --preload),
+    since SQLite connections and server threads must not be shared with the parent.
+    A cached handle is revalidated against the collection's generation token, which
+    changes when the collection is dropped and recreated in any process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._client = None
+        self._collections = {}
+
+    def client(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+        return self._client
+
+    def _reset(self):
+        # Caller holds self._lock
+        if self._pid is not None:
+            # Forked child: drop the systems chromadb cached for the parent process
+            from chromadb.api.client import SharedSystemClient
+            SharedSystemClient.clear_system_cache()
+        if CHROMA_SERVER_HOST:
+            self._client = HttpClient(host=CHROMA_SERVER_HOST, port=CHROMA_SERVER_PORT)
+        else:
+            self._client = PersistentClient(path=path)
+        self._collections = {}
+        self._pid = os.getpid()
+
+    def collection(self, name):
+        client = self.client()
+        generation = _read_token(f"{name}.generation")
+        cached = self._collections.get(name)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        with self._lock:
+            handle = client.get_or_create_collection(name)
+            self._collections[name] = (generation, handle)
+        return handle
+
+    def recreated(self, name):
+        """
+        Records that a collection was dropped and created again, invalidating handles in all processes.
+        """
+        _write_token(f"{name}.generation")
+        with self._lock:
+            self._collections.pop(name, None)
+
+
+_manager = ChromaClientManager()
+
 
 # Initialize ChromaDB client with the new configuration
 def get_chroma_client():
-    return PersistentClient(path=path)
+    return _manager.client()
 
 # Get a specific collection
 def get_collection(name):
+    return _manager.collection(name)
+
+
+def mark_collection_changed(name):
+    """
+    Records that a collection was written. Caches derived from the collection compare
+    versions to detect changes, also across processes such as the ingestion workers.
+    """
+    _write_token(name)
+
+
+def get_collection_version(name):
+    """
+    Returns a token that changes whenever the collection is written.
+    """
+    return _read_token(name)
+
+
+def paginate_collection(collection, page=1, per_page=50, include=("metadatas",), search=None):
+    """
+    Fetches one page of a collection with limit/offset. With `search`, only documents
+    whose text contains it are listed; their ids are resolved by Chroma first, and the
+    page is then fetched by id.
+
+    Returns:
+        dict: 'ids', 'documents', 'metadatas' of the page plus 'page', 'pages' and 'total'.
+    """
+    matching_ids = None
+    if search:
+        matching_ids = collection.get(where_document={"$contains": search}, include=[])["ids"]
+        total = len(matching_ids)
+    else:
+        total = collection.count()
+    pages = max(1, -(-total // per_page))
+    page = min(max(1, page), pages)
+    offset = (page - 1) * per_page
+    if matching_ids is None:
+        results = collection.get(include=list(include), limit=per_page, offset=offset)
+    elif matching_ids[offset:offset + per_page]:
+        results = collection.get(ids=matching_ids[offset:offset + per_page], include=list(include))
+    else:
+        results = {"ids": []}
+    return {
+        "ids": results["ids"],
+        "documents": results.get("documents") or [None] * len(results["ids"]),
+        "metadatas": results.get("metadatas") or [{} for _ in results["ids"]],
+        "page": page,
+        "pages": pages,
+        "total": total,
+        "offset": offset,
+    }
+
+
+TRUNCATE_MODES = ("batches", "recreate")
+
+
+def truncate_collection(name, mode="batches", batch_size=1000):
+    """
+    Removes every document of a collection and yields progress dicts after each step.
+
+    'batches' deletes at most batch_size ids per request, reading only ids.
+    'recreate' drops the collection and creates it again with the same metadata
+    (e.g. the distance function), which is faster for large collections.
+    The collection's entries in the lexical index and document store are cleared and
+    its version bumped; the literature catalog is cleared by the caller, which owns
+    the database session.
+    """
+    if mode not in TRUNCATE_MODES:
+        raise ValueError(f"Unknown truncate mode '{mode}', expected one of {TRUNCATE_MODES}")
+    if batch_size < 1:
+        raise ValueError(f"Invalid batch size {batch_size}, expected at least 1")
     client = get_chroma_client()
-    return client.get_or_create_collection(name)
+    collection = get_collection(name)
+    total = collection.count()
+    yield {"collection": name, "mode": mode, "deleted": 0, "total": total, "done": False}
+
+    deleted = 0
+    if mode == "recreate":
+        metadata = collection.metadata or None
+        client.delete_collection(name)
+        client.create_collection(name, metadata=metadata)
+        _manager.recreated(name)
+        deleted = total
+    else:
+        while True:
+            # Deleted ids disappear from the listing, so the first page is always the next batch
+            ids = collection.get(include=[], limit=batch_size)["ids"]
+            if not ids:
+                break
+            collection.delete(ids=ids)
+            deleted += len(ids)
+            yield {"collection": name, "mode": mode, "deleted": deleted, "total": total, "done": False}
 
+    get_lexical_index().clear(name)
+    get_document_store().clear(name)
+    mark_collection_changed(name)
+    yield {"collection": name, "mode": mode, "deleted": deleted, "total": total, "done": True}
 
-def get_chroma_retriever(collection_name, model_name="xlm-roberta-base", k=5):
-    # Access or initialize the cache
-    cache = current_app.config.get('CACHE', {})
-    retriever_cache_key = f"retriever_{collection_name}_{model_name}_{k}"
 
-    # Check if the retriever is already cached
-    if retriever_cache_key not in cache:
-        # Create the embedding model
-        embedding_model = HuggingFaceEmbeddings(model_name=model_name)
-        
-        # Create or load the vectorstore
-        vectorstore = Chroma(
+def document_exists(collection, doc_id):
+    """
+    Checks whether an id exists with a primary-key lookup, without transferring documents.
+    """
+    return bool(collection.get(ids=[doc_id], include=[])["ids"])
+
+
+class RegistryEmbeddings(Embeddings):
+    """
+    LangChain embedding function backed by the shared models of app/vectorizer.py,
+    so the retriever reuses the loaded weights and the embedding cache.
+    """
+
+    def __init__(self, model_name=MULTILINGUAL_MODEL_NAME, pooling=DEFAULT_POOLING):
+        self.pooling = pooling
+        if model_name in (ENGLISH_MODEL_NAME, "all-mpnet-base-v2"):
+            self.model_name = ENGLISH_MODEL_NAME
+        elif model_name == MULTILINGUAL_MODEL_NAME:
+            self.model_name = MULTILINGUAL_MODEL_NAME
+        else:
+            raise ValueError(f"Unsupported embedding model '{model_name}'")
+
+    def embed_documents(self, texts):
+        if self.model_name == ENGLISH_MODEL_NAME:
+            return vectorize_sources_batch(texts)
+        return vectorize_texts(texts, pooling=self.pooling).tolist()
+
+    def embed_query(self, text):
+        if self.model_name == ENGLISH_MODEL_NAME:
+            return vectorize_sources(text)
+        return vectorize_text(text, pooling=self.pooling)
+
+
+def get_chroma_retriever(collection_name, model_name=MULTILINGUAL_MODEL_NAME, k=5):
+    cache = get_object_cache()
+    # The collection id changes when a collection is truncated by recreating it
+    collection_id = get_collection(collection_name).id
+    pooling = pooling_for(collection_name)
+
+    # One embedding wrapper per model and one vector store per collection, shared by all k
+    embedding_model = cache.get_or_build(
+        f"embeddings_{model_name}_{pooling}",
+        lambda: RegistryEmbeddings(model_name=model_name, pooling=pooling),
+    )
+    vectorstore = cache.get_or_build(
+        f"vectorstore_{collection_name}_{collection_id}_{model_name}",
+        lambda: Chroma(
+            client=get_chroma_client(),
             collection_name=collection_name,
             embedding_function=embedding_model,
-            persist_directory=path
-        )
-        
-        # Create the retriever and cache it
-        retriever = vectorstore.as_retriever(search_kwargs={"k": k})
-        cache[retriever_cache_key] = retriever
-        current_app.config['CACHE'] = cache
-        
-    # Return the cached retriever
-    return cache[retriever_cache_key]
+        ),
+    )
+
+    # The retriever (BM25 fused with vector search) only holds k on top of the vector store
+    return cache.get_or_build(
+        f"retriever_{collection_name}_{collection_id}_{model_name}_{k}",
+        lambda: HybridRetriever(
+            vectorstore=vectorstore,
+            collection_name=collection_name,
+            k=k,
+            rerank=RERANK_ENABLED,
+            candidates=RERANK_CANDIDATES,
+        ),
+    )
 
 
 
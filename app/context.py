@@ -0,0 +1,181 @@
+import os
+import re
+from app.utils.text_utils import split_sentences
+
+# Tokens of retrieved text allowed in a RAG prompt
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 2048))
+# A document is only truncated to fit the budget if at least this many tokens remain
+CONTEXT_MIN_TOKENS = int(os.environ.get("CONTEXT_MIN_TOKENS", 64))
+
+_CHUNK_NUMBER = re.compile(r"_chunk_(\d+)$")
+
+
+def citation(metadata):
+    """
+    Returns the compact label a document is cited with in the prompt.
+    """
+    if metadata.get("chapter_id"):
+        return metadata["chapter_id"]
+    if metadata.get("document_id"):
+        start, end = metadata.get("page_start"), metadata.get("page_end")
+        pages = f"p. {start}" if start == end or end is None else f"pp. {start}-{end}"
+        return f"{metadata['document_id']}, {pages}"
+    return metadata.get("id", "")
+
+
+def _chunk_number(metadata):
+    match = _CHUNK_NUMBER.search(metadata.get("chunk_id", ""))
+    return int(match.group(1)) if match else None
+
+
+def _merge_sentences(first, second):
+    """
+    Joins two sentence lists, dropping the leading sentences of `second` that repeat
+    the end of `first` (the overlap between consecutive chunks).
+    """
+    for size in range(min(len(first), len(second)), 0, -1):
+        if first[-size:] == second[:size]:
+            return first + second[size:]
+    return first + second
+
+
+def _overlaps(entry, metadata):
+    # Consecutive chunks of the same PDF share sentences and usually pages
+    if not entry["document_id"] or entry["document_id"] != metadata.get("document_id"):
+        return False
+    number = _chunk_number(metadata)
+    if number is not None and any(abs(number - other) == 1 for other in entry["chunks"]):
+        return True
+    start, end = metadata.get("page_start"), metadata.get("page_end")
+    return start is not None and end is not None and start <= entry["page_end"] and end >= entry["page_start"]
+
+
+def _cut_to_tokens(sentence, count_tokens, limit):
+    """
+    Returns the longest word prefix of `sentence` with at most `limit` tokens and its token count.
+    """
+    words = sentence.split()
+    low, high = 0, len(words)
+    best = ("", 0)
+    while low < high:
+        middle = (low + high + 1) // 2
+        prefix = " ".join(words[:middle])
+        tokens = count_tokens([prefix])[0]
+        if tokens <= limit:
+            low, best = middle, (prefix, tokens)
+        else:
+            high = middle - 1
+    return best
+
+
+def pack_context(documents, count_tokens, budget=CONTEXT_TOKEN_BUDGET, min_tokens=CONTEXT_MIN_TOKENS):
+    """
+    Assembles the context of a RAG prompt from documents ordered by relevance.
+
+    Duplicate texts are sent once, cited with the labels of all documents that contain
+    them, and overlapping chunks of the same literature PDF are merged into one passage.
+    Passages are then added in order of relevance, each prefixed with its citation,
+    until `budget` tokens are used. A passage that does not fit is cut at a sentence
+    boundary if at least `min_tokens` remain, or within its first sentence if that
+    sentence alone does not fit; otherwise it is skipped and later, shorter passages
+    may still fill the budget.
+
+    Args:
+        documents (list): LangChain documents, most relevant first.
+        count_tokens (callable): Returns the token count of every text in a list.
+
+    Returns:
+        tuple: (context string, stats dict with document counts and 'tokens').
+    """
+    entries = []
+    seen = {}  # text -> entry it was added to
+    merged = 0
+    for document in documents:
+        text = " ".join((document.page_content or "").split())
+        metadata = document.metadata or {}
+        if not text:
+            continue
+        if text in seen:
+            # Another chapter or note with the same text is cited next to the first one
+            entry = seen[text]
+            label = citation(metadata)
+            if label and label not in entry["also_cited"] and label != citation(entry["metadata"]):
+                entry["also_cited"].append(label)
+            merged += 1
+            continue
+        target = next((entry for entry in entries if _overlaps(entry, metadata)), None)
+        number = _chunk_number(metadata)
+        if target is not None:
+            # Keep the text in reading order, whichever chunk ranked higher
+            sentences = split_sentences(text)
+            before = number is not None and target["chunks"] and number < min(target["chunks"])
+            target["sentences"] = (
+                _merge_sentences(sentences, target["sentences"]) if before
+                else _merge_sentences(target["sentences"], sentences)
+            )
+            if number is not None:
+                target["chunks"].append(number)
+            target["page_start"] = min(target["page_start"], metadata.get("page_start", target["page_start"]))
+            target["page_end"] = max(target["page_end"], metadata.get("page_end", target["page_end"]))
+            seen[text] = target
+            merged += 1
+            continue
+        entries.append({
+            "metadata": metadata,
+            "document_id": metadata.get("document_id"),
+            "chunks": [number] if number is not None else [],
+            "page_start": metadata.get("page_start", 0),
+            "page_end": metadata.get("page_end", 0),
+            "sentences": split_sentences(text),
+            "also_cited": [],
+        })
+        seen[text] = entries[-1]
+
+    passages = []
+    used = 0
+    truncated = 0
+    for entry in entries:
+        metadata = dict(entry["metadata"])
+        if entry["document_id"]:
+            metadata.update(page_start=entry["page_start"], page_end=entry["page_end"])
+        label = f"[{'; '.join([citation(metadata)] + entry['also_cited'])}] "
+        sentence_tokens = count_tokens([label] + entry["sentences"])
+        label_tokens, sentence_tokens = sentence_tokens[0], sentence_tokens[1:]
+        if used + label_tokens + sum(sentence_tokens) <= budget:
+            passages.append(label + " ".join(entry["sentences"]))
+            used += label_tokens + sum(sentence_tokens)
+            continue
+
+        remaining = budget - used - label_tokens
+        if remaining < min_tokens:
+            # Too little room to cut this passage; a shorter one further down may still fit
+            continue
+        kept = []
+        for sentence, tokens in zip(entry["sentences"], sentence_tokens):
+            if tokens > remaining:
+                break
+            kept.append(sentence)
+            remaining -= tokens
+        if not kept:
+            # The first sentence alone is over budget; send its beginning rather than no context
+            cut, tokens = _cut_to_tokens(entry["sentences"][0], count_tokens, remaining)
+            if cut:
+                kept.append(cut)
+                remaining -= tokens
+        if kept:
+            passages.append(label + " ".join(kept))
+            used = budget - remaining
+            truncated += 1
+        if used >= budget:
+            break
+
+    stats = {
+        "documents": len(documents),
+        "merged": merged,
+        "passages": len(passages),
+        "dropped": len(entries) - len(passages),
+        "truncated": truncated,
+        "tokens": used,
+        "budget": budget,
+    }
+    return "\n\n".join(passages), stats
@@ -0,0 +1,158 @@
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+
+# Location of the side store for bulky document fields
+DOCUMENT_STORE_PATH = os.environ.get("DOCUMENT_STORE_PATH", "./data/document_store.db")
+
+# Chapter fields kept in the side store instead of Chroma metadata
+STORED_FIELDS = ["latin_heading", "latin_content", "german_content", "english_heading"]
+
+
+class DocumentStore:
+    """
+    SQLite store for text fields that are rendered but never filtered on, keyed by
+    (collection, document id, field), so a page can load just the fields it shows.
+    Metadata blocks shared by all chapters of an uploaded file are stored once and
+    referenced by their hash.
+    """
+
+    def __init__(self, path=DOCUMENT_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS fields (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (collection, doc_id, field)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS metadata_blocks (
+                block_id TEXT PRIMARY KEY,
+                metadata TEXT NOT NULL
+            );
+            """
+        )
+        connection.commit()
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def put_many(self, collection, doc_ids, field_dicts):
+        """
+        Stores the fields of documents, replacing all earlier fields of the same ids.
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "DELETE FROM fields WHERE collection = ? AND doc_id = ?",
+                [(collection, doc_id) for doc_id in doc_ids],
+            )
+            connection.executemany(
+                "INSERT INTO fields (collection, doc_id, field, value) VALUES (?, ?, ?, ?)",
+                [
+                    (collection, doc_id, field, value)
+                    for doc_id, fields in zip(doc_ids, field_dicts)
+                    for field, value in fields.items()
+                    if value
+                ],
+            )
+
+    def get_fields(self, collection, doc_ids, fields):
+        """
+        Returns {doc_id: {field: value}} for the requested fields of the given documents.
+        """
+        result = {doc_id: {} for doc_id in doc_ids}
+        if not doc_ids or not fields:
+            return result
+        connection = self._connection()
+        field_marks = ",".join("?" * len(fields))
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(doc_ids), 500):
+            chunk = list(doc_ids[start:start + 500])
+            rows = connection.execute(
+                f"""
+                SELECT doc_id, field, value FROM fields
+                WHERE collection = ? AND doc_id IN ({",".join("?" * len(chunk))}) AND field IN ({field_marks})
+                """,
+                [collection, *chunk, *fields],
+            )
+            for doc_id, field, value in rows:
+                result[doc_id][field] = value
+        return result
+
+    def delete(self, collection, doc_ids):
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "DELETE FROM fields WHERE collection = ? AND doc_id = ?",
+                [(collection, doc_id) for doc_id in doc_ids],
+            )
+
+    def clear(self, collection):
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM fields WHERE collection = ?", (collection,))
+
+    def put_metadata_block(self, metadata):
+        """
+        Stores a metadata block once and returns its id (a short hash of its content).
+        """
+        encoded = json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+        block_id = hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:16]
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO metadata_blocks (block_id, metadata) VALUES (?, ?)", (block_id, encoded)
+            )
+        return block_id
+
+    def get_metadata_block(self, block_id):
+        row = self._connection().execute(
+            "SELECT metadata FROM metadata_blocks WHERE block_id = ?", (block_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def hydrate(self, collection, doc_ids, metadatas, fields):
+        """
+        Returns copies of `metadatas` with the requested stored fields filled in.
+        Fields already present in the metadata (documents imported before the side
+        store existed) are kept as they are.
+        """
+        missing = [field for field in fields if any(field not in (metadata or {}) for metadata in metadatas)]
+        stored = self.get_fields(collection, list(doc_ids), missing)
+        return [
+            {**stored.get(doc_id, {}), **(metadata or {})}
+            for doc_id, metadata in zip(doc_ids, metadatas)
+        ]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_document_store():
+    """
+    Returns the process-wide document store.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore()
+    return _store
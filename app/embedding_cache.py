@@ -0,0 +1,257 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+# Location of the persistent cache and its size limits
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", "./data/embedding_cache.db")
+EMBEDDING_CACHE_MAX_MB = float(os.environ.get("EMBEDDING_CACHE_MAX_MB", 512))
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", 4096))
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+
+# Check the on-disk size after this many new entries
+_EVICTION_CHECK_INTERVAL = 256
+
+
+def text_hash(text):
+    """
+    Returns the sha256 hex digest of a text.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by (model name, normalization settings, sha256 of text).
+
+    An in-process LRU holds recently used vectors; a SQLite file stores all vectors as
+    float32 blobs and is shared between processes. When the file grows beyond `max_mb`
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_mb=EMBEDDING_CACHE_MAX_MB,
+                 memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._puts_since_check = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                settings TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, settings, text_hash)
+            )
+            """
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+        connection.commit()
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, model, settings, texts):
+        """
+        Looks up the embeddings of `texts`. Returns a list with a float32 array for every
+        cached text and None for every miss.
+        """
+        keys = [(model, settings, text_hash(text)) for text in texts]
+        results = [None] * len(keys)
+        missing = []
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    results[i] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(i)
+
+        if not missing:
+            return results
+
+        connection = self._connection()
+        hashes = sorted({keys[i][2] for i in missing})
+        found = {}
+        # Stay below SQLite's limit on query parameters
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = connection.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND settings = ? AND text_hash IN ({placeholders})",
+                [model, settings, *chunk],
+            ).fetchall()
+            found.update({row[0]: np.frombuffer(row[1], dtype=np.float32) for row in rows})
+
+        if found:
+            now = time.time()
+            connection.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND settings = ? AND text_hash = ?",
+                [(now, model, settings, digest) for digest in found],
+            )
+            connection.commit()
+
+        with self._lock:
+            for i in missing:
+                vector = found.get(keys[i][2])
+                if vector is None:
+                    self.misses += 1
+                    continue
+                results[i] = vector
+                self.disk_hits += 1
+                self._remember(keys[i], vector)
+        return results
+
+    def put_many(self, model, settings, texts, vectors):
+        """
+        Stores the embeddings of `texts` in both tiers.
+        """
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                key = (model, settings, text_hash(text))
+                self._remember(key, vector)
+                rows.append((model, settings, key[2], vector.tobytes(), now))
+
+        connection = self._connection()
+        connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+        connection.commit()
+
+        with self._lock:
+            self._puts_since_check += len(rows)
+            check = self._puts_since_check >= _EVICTION_CHECK_INTERVAL
+            if check:
+                self._puts_since_check = 0
+        if check:
+            self._evict()
+
+    def _remember(self, key, vector):
+        # Caller holds self._lock
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        """
+        Deletes least recently used entries until the stored vectors fit into max_bytes.
+        """
+        connection = self._connection()
+        count, total_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()
+        if total_bytes <= self.max_bytes or not count:
+            return
+        # Evict down to 90% of the limit so eviction does not run on every put
+        excess = total_bytes - int(self.max_bytes * 0.9)
+        to_delete = max(1, int(count * excess / total_bytes))
+        connection.execute(
+            "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (to_delete,),
+        )
+        connection.commit()
+        self.evictions += to_delete
+
+    def clear(self):
+        """
+        Removes all cached embeddings.
+        """
+        with self._lock:
+            self._memory.clear()
+        connection = self._connection()
+        connection.execute("DELETE FROM embeddings")
+        connection.commit()
+
+    def stats(self):
+        """
+        Returns hit/miss counters of this process and the size of the persistent tier.
+        """
+        count, total_bytes = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "memory_entries": len(self._memory),
+            "disk_entries": count,
+            "disk_megabytes": round(total_bytes / (1024 * 1024), 2),
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    """
+    Returns the process-wide embedding cache, or None if caching is disabled.
+    """
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
+
+
+def cached_embeddings(model, settings, texts, embed, stats=None):
+    """
+    Returns one float32 vector per text, calling `embed(list_of_texts)` only for texts
+    that are not cached yet. Duplicate texts within one call are embedded once.
+
+    If `stats` is given, stats['embedded'] is increased by the number of texts this call
+    embedded, and the texts are added to stats['embedded_texts'] if that set is present.
+    """
+    cache = get_embedding_cache()
+    if cache is None:
+        missing_texts = list(dict.fromkeys(texts))
+        results = None
+    else:
+        results = cache.get_many(model, settings, texts)
+        missing_texts = list(dict.fromkeys(text for text, vector in zip(texts, results) if vector is None))
+    if stats is not None:
+        stats["embedded"] = stats.get("embedded", 0) + len(missing_texts)
+        if "embedded_texts" in stats:
+            stats["embedded_texts"].update(missing_texts)
+    if cache is None:
+        return list(np.asarray(embed(list(texts)), dtype=np.float32)) if texts else []
+
+    if missing_texts:
+        vectors = np.asarray(embed(missing_texts), dtype=np.float32)
+        cache.put_many(model, settings, missing_texts, vectors)
+        computed = dict(zip(missing_texts, vectors))
+        results = [computed[text] if vector is None else vector for text, vector in zip(texts, results)]
+    return results
@@ -0,0 +1,339 @@
+import os
+import json
+import time
+import queue
+import socket
+import struct
+import threading
+import socketserver
+from collections import Counter, deque
+import numpy as np
+
+# Unix socket of the embedding server; when set, the vectorizer sends all requests there
+EMBEDDING_SERVER_SOCKET = os.environ.get("EMBEDDING_SERVER_SOCKET", "")
+# Requests arriving within this window are combined into one forward pass
+BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_SERVER_BATCH_WINDOW_MS", 5))
+# Upper bound on texts per combined forward pass
+MAX_BATCH_TEXTS = int(os.environ.get("EMBEDDING_SERVER_MAX_BATCH", 64))
+# Seconds a client waits for a response
+CLIENT_TIMEOUT = float(os.environ.get("EMBEDDING_SERVER_TIMEOUT", 120))
+# Seconds a server thread waits for the forward pass of its request; below CLIENT_TIMEOUT,
+# so the client receives an error instead of timing out itself
+REQUEST_TIMEOUT = float(os.environ.get("EMBEDDING_SERVER_REQUEST_TIMEOUT", 100))
+# Load the models in the calling process when the server cannot be reached. Off by default:
+# every web and worker process would hold its own copy of both models again.
+LOCAL_FALLBACK = os.environ.get("EMBEDDING_SERVER_FALLBACK", "false").lower() == "true"
+
+# Set in the server process, so the vectorizer there uses the local models
+SERVING = False
+
+_FRAME = struct.Struct("!II")
+
+
+class EmbeddingServerUnavailable(ConnectionError):
+    """
+    Raised when the embedding server cannot be reached.
+    """
+
+
+class EmbeddingServerTimeout(TimeoutError):
+    """
+    Raised when the embedding server accepted a request but did not answer in time.
+    The request may still be running there, so it is neither retried nor embedded locally.
+    """
+
+
+def _send_message(sock, header, payload=b""):
+    encoded = json.dumps(header).encode("utf-8")
+    sock.sendall(_FRAME.pack(len(encoded), len(payload)) + encoded + payload)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _recv_message(sock):
+    """
+    Reads one framed message. Returns (header, payload) or None if the peer closed the connection.
+    """
+    frame = _recv_exactly(sock, _FRAME.size)
+    if frame is None:
+        return None
+    header_size, payload_size = _FRAME.unpack(frame)
+    header = _recv_exactly(sock, header_size)
+    payload = _recv_exactly(sock, payload_size) if payload_size else b""
+    if header is None or payload is None:
+        return None
+    return json.loads(header), payload
+
+
+class _Pending:
+    """
+    One embedding request waiting for the batcher.
+    """
+
+    def __init__(self, key, texts):
+        self.key = key
+        self.texts = texts
+        self.received = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.embedded = 0  # Texts of this request that were not in the embedding cache
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    Collects concurrent embedding requests and runs requests for the same model,
+    pooling and backend as one forward pass.
+    """
+
+    def __init__(self, window_ms=BATCH_WINDOW_MS, max_batch=MAX_BATCH_TEXTS, timeout=REQUEST_TIMEOUT):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.queue = queue.Queue()
+        self.batch_sizes = Counter()
+        self.latencies = deque(maxlen=2048)
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, key, texts):
+        """
+        Blocks until the embeddings of `texts` are computed. Returns them as a float32 matrix
+        together with the number of texts that were not in the embedding cache. Raises
+        EmbeddingServerTimeout if that takes longer than the request timeout.
+        """
+        pending = _Pending(key, texts)
+        self.queue.put(pending)
+        if not pending.done.wait(self.timeout):
+            # The batcher thread is stuck or overloaded; the result is discarded when it arrives
+            self.requests += 1
+            self.timeouts += 1
+            raise EmbeddingServerTimeout(f"No embeddings within {self.timeout:g} s")
+        self.latencies.append(time.perf_counter() - pending.received)
+        self.requests += 1
+        if pending.error is not None:
+            self.errors += 1
+            raise pending.error
+        return pending.result, pending.embedded
+
+    def _collect(self):
+        first = self.queue.get()
+        batch = [first]
+        count = len(first.texts)
+        deadline = time.perf_counter() + self.window
+        while count < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                pending = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            count += len(pending.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            groups = {}
+            for pending in batch:
+                groups.setdefault(pending.key, []).append(pending)
+            for key, group in groups.items():
+                self._process(key, group)
+
+    def _process(self, key, group):
+        from app.vectorizer import vectorize_texts, _vectorize_english
+
+        model, pooling, backend = key
+        texts = [text for pending in group for text in pending.texts]
+        # Power-of-two buckets: 1, 2, 4, 8, ...
+        self.batch_sizes[1 << (len(texts).bit_length() - 1)] += 1
+        stats = {"embedded_texts": set()}
+        try:
+            if model == "multilingual":
+                embeddings = vectorize_texts(texts, pooling=pooling, backend=backend, stats=stats)
+            else:
+                embeddings = _vectorize_english(texts, backend=backend, stats=stats)
+            offset = 0
+            for pending in group:
+                pending.result = embeddings[offset:offset + len(pending.texts)]
+                offset += len(pending.texts)
+                # A text shared by several requests is counted for the first one
+                embedded = stats["embedded_texts"].intersection(pending.texts)
+                pending.embedded = len(embedded)
+                stats["embedded_texts"] -= embedded
+        except Exception as e:
+            for pending in group:
+                pending.error = e
+        finally:
+            for pending in group:
+                pending.done.set()
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 2)
+
+        return {
+            "queue_depth": self.queue.qsize(),
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "latency_p50_ms": percentile(0.50),
+            "latency_p99_ms": percentile(0.99),
+        }
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            message = _recv_message(self.request)
+            if message is None:
+                return
+            header, _ = message
+            try:
+                if header.get("op") == "stats":
+                    from app.model_registry import registry
+                    _send_message(self.request, {**self.server.batcher.stats(), "models": registry.stats()})
+                    continue
+                key = (header["model"], header.get("pooling", "cls"), header.get("backend", "torch"))
+                embeddings, embedded = self.server.batcher.submit(key, header["texts"])
+                embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+                _send_message(self.request, {"shape": list(embeddings.shape), "embedded": embedded},
+                              embeddings.tobytes())
+            except Exception as e:
+                _send_message(self.request, {"error": str(e)})
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, batcher=None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+        self.batcher = batcher or MicroBatcher()
+
+
+def serve(socket_path=EMBEDDING_SERVER_SOCKET, preload=True):
+    """
+    Runs the embedding server in the current process until interrupted.
+    """
+    global SERVING
+    SERVING = True
+    if preload:
+        from app.vectorizer import get_multilingual_model, get_english_model
+        get_multilingual_model()
+        get_english_model()
+
+    server = EmbeddingServer(socket_path)
+    print(f"Embedding server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+class EmbeddingClient:
+    """
+    Client of the embedding server. Keeps one connection per thread.
+    """
+
+    def __init__(self, socket_path=EMBEDDING_SERVER_SOCKET, timeout=CLIENT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "socket", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError as e:
+                sock.close()
+                raise EmbeddingServerUnavailable(f"Cannot connect to {self.socket_path}: {e}")
+            self._local.socket = sock
+        return sock
+
+    def _request(self, header):
+        # A request is sent again on a fresh connection only if sending failed, e.g. because
+        # the server restarted since the connection was opened. Once it is sent, it may be
+        # running on the server, so timeouts and dropped responses are not retried.
+        for attempt in range(2):
+            sock = self._connection()
+            try:
+                _send_message(sock, header)
+            except OSError as e:
+                self._close()
+                if attempt:
+                    raise EmbeddingServerUnavailable(f"Embedding server request failed: {e}")
+                continue
+            try:
+                message = _recv_message(sock)
+            except socket.timeout:
+                # The response may still arrive on this connection, so it cannot be reused
+                self._close()
+                raise EmbeddingServerTimeout(f"No response from the embedding server within {self.timeout:g} s")
+            except OSError as e:
+                self._close()
+                raise EmbeddingServerUnavailable(f"Embedding server connection lost: {e}")
+            if message is None:
+                self._close()
+                raise EmbeddingServerUnavailable("Embedding server closed the connection")
+            return message
+
+    def _close(self):
+        self._local.socket.close()
+        self._local.socket = None
+
+    def embed(self, model, texts, pooling="cls", backend="torch", stats=None):
+        """
+        Returns the embeddings of `texts` as a float32 matrix.
+        `model` is 'multilingual' (RoBERTa-XLM) or 'english' (all-mpnet-v2). The number of
+        texts the server had to encode is added to stats['embedded'] if `stats` is given.
+        """
+        header, payload = self._request(
+            {"op": "embed", "model": model, "pooling": pooling, "backend": backend, "texts": list(texts)}
+        )
+        if "error" in header:
+            raise RuntimeError(f"Embedding server error: {header['error']}")
+        if stats is not None:
+            stats["embedded"] = stats.get("embedded", 0) + header.get("embedded", 0)
+        return np.frombuffer(payload, dtype=np.float32).reshape(header["shape"]).copy()
+
+    def stats(self):
+        header, _ = self._request({"op": "stats"})
+        return header
+
+
+_client = None
+
+
+def get_client():
+    """
+    Returns the process-wide embedding server client.
+    """
+    global _client
+    if _client is None:
+        _client = EmbeddingClient()
+    return _client
@@ -0,0 +1,164 @@
+import os
+import json
+import time
+from app.vectorizer import vectorize_sources_batch
+from app.lexical_index import get_lexical_index
+from app.document_store import get_document_store
+from app.chroma import mark_collection_changed
+
+# Number of chapters encoded per forward pass of the English model
+ENCODE_BATCH_SIZE = int(os.environ.get("INGEST_ENCODE_BATCH_SIZE", 32))
+# Number of chapters written to Chroma per upsert call
+WRITE_BATCH_SIZE = int(os.environ.get("INGEST_WRITE_BATCH_SIZE", 256))
+
+
+class ChapterImportError(ValueError):
+    """
+    Raised when an uploaded JSON file does not have the expected structure.
+    """
+
+
+def parse_chapters(data):
+    """
+    Validates a whole chapter file before anything is embedded or written.
+
+    Args:
+        data (dict): The decoded JSON file with 'metadata' and 'chapters'.
+
+    Returns:
+        tuple: (metadata, records, skipped) where records is a list of dicts with
+        'id', 'document', 'metadata', 'texts' and 'lexical_text' keys and skipped lists the positions of
+        chapters without an id or English content. 'metadata' holds the small fields kept in
+        Chroma, 'texts' the headings and contents kept in the document store.
+    """
+    if not isinstance(data, dict):
+        raise ChapterImportError("Invalid JSON structure. Expected an object with metadata and chapters.")
+
+    metadata = data.get("metadata", {})
+    chapters = data.get("chapters", [])
+    if not metadata or not isinstance(metadata, dict) or not isinstance(chapters, list):
+        raise ChapterImportError("Invalid JSON structure. Missing metadata or chapters.")
+
+    records = []
+    skipped = []
+    seen_ids = set()
+    for position, chapter in enumerate(chapters):
+        if not isinstance(chapter, dict):
+            skipped.append(position)
+            continue
+
+        chapter_id = chapter.get("id")
+        english_content = chapter.get("english", {}).get("content", "")
+        if not chapter_id or not english_content:
+            skipped.append(chapter_id or position)
+            continue
+
+        if chapter_id in seen_ids:
+            raise ChapterImportError(f"Duplicate chapter id '{chapter_id}' in JSON file.")
+        seen_ids.add(chapter_id)
+
+        # Chroma keeps ids and small filterable fields; texts go to the document store
+        chapter_metadata = {
+            "chapter_id": chapter_id,
+            "chapter_url": chapter.get("url", ""),
+        }
+        if isinstance(chapter.get("book"), (int, float, str)):
+            chapter_metadata["book"] = chapter["book"]
+        texts = {
+            "latin_content": chapter.get("latin", {}).get("content", ""),
+            "german_content": chapter.get("german", {}).get("content", ""),
+            "english_heading": chapter.get("english", {}).get("heading", ""),
+            "latin_heading": chapter.get("latin", {}).get("heading", ""),
+        }
+        # Text for the BM25 index: the id plus headings, contents and lemmatized texts of all languages
+        lexical_text = " ".join(
+            [chapter_id] + [
+                chapter.get(language, {}).get(field, "")
+                for language in ("latin", "german", "english")
+                for field in ("heading", "content", "processed")
+            ]
+        )
+        records.append({
+            "id": chapter_id,
+            "document": english_content,
+            "metadata": chapter_metadata,
+            "texts": texts,
+            "lexical_text": lexical_text,
+        })
+
+    return metadata, records, skipped
+
+
+def import_chapters(collection, data, encode_batch_size=None, write_batch_size=None):
+    """
+    Imports all chapters of a JSON file (an open file or the decoded dict) into a
+    Chroma collection.
+
+    The file is decoded and validated as a whole first. Chapters are then processed in windows of
+    `write_batch_size`: the English content of a window is encoded in batches of
+    `encode_batch_size` and written with a single upsert (and to the BM25 index), so memory stays bounded
+    for files with tens of thousands of chapters and re-imports replace chapters
+    instead of failing on existing ids. Headings and Latin/German contents are written
+    to the document store rather than to Chroma metadata.
+
+    Returns:
+        dict: Chapter counts (imported, newly embedded) and per-stage timings (parse, encode, write) in seconds.
+    """
+    encode_batch_size = encode_batch_size or ENCODE_BATCH_SIZE
+    write_batch_size = write_batch_size or WRITE_BATCH_SIZE
+
+    start = time.perf_counter()
+    if hasattr(data, "read"):
+        try:
+            data = json.load(data)
+        except ValueError as e:
+            raise ChapterImportError(f"Invalid JSON file: {e}")
+    metadata, records, skipped = parse_chapters(data)
+    index = get_lexical_index()
+    store = get_document_store()
+    # The global metadata block is stored once and referenced from every chapter
+    block_id = store.put_metadata_block(metadata)
+    stats = {
+        "chapters": len(records),
+        "embedded": 0,
+        "skipped": skipped,
+        "parse_seconds": time.perf_counter() - start,
+        "encode_seconds": 0.0,
+        "write_seconds": 0.0,
+    }
+
+    for offset in range(0, len(records), write_batch_size):
+        window = records[offset:offset + write_batch_size]
+
+        start = time.perf_counter()
+        # Counts only the chapters this import had to encode; unchanged ones come from the embedding cache
+        embeddings = vectorize_sources_batch([record["document"] for record in window],
+                                             batch_size=encode_batch_size, stats=stats)
+        stats["encode_seconds"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        store.put_many(collection.name, [record["id"] for record in window], [record["texts"] for record in window])
+        collection.upsert(
+            ids=[record["id"] for record in window],
+            documents=[record["document"] for record in window],  # Only English content as document
+            metadatas=[{**record["metadata"], "metadata_block": block_id} for record in window],
+            embeddings=embeddings,
+        )
+        index.add_documents(collection.name, [record["id"] for record in window],
+                            [record["lexical_text"] for record in window])
+        mark_collection_changed(collection.name)
+        stats["write_seconds"] += time.perf_counter() - start
+        print(f"Imported chapters {offset + 1}-{offset + len(window)} of {len(records)}")
+
+    return stats
+
+
+def format_import_stats(stats):
+    """
+    Formats the timings returned by import_chapters for flash messages and logs.
+    """
+    return (
+        f"{stats['chapters']} chapters imported, {stats['embedded']} newly embedded "
+        f"(parse {stats['parse_seconds']:.2f}s, encode {stats['encode_seconds']:.2f}s, "
+        f"write {stats['write_seconds']:.2f}s)"
+    )
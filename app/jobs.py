@@ -0,0 +1,253 @@
+import os
+import time
+import itertools
+import uuid
+import multiprocessing
+from datetime import datetime
+from app.models import db, IngestJob, LiteratureDocument
+
+# Seconds an idle worker waits before polling the job table again
+POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", 2))
+# Number of chunks embedded and committed to Chroma together
+JOB_BATCH_SIZE = int(os.environ.get("JOB_BATCH_SIZE", 16))
+# Chunk sizes for literature PDFs, in tokens of the embedding model
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 256))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 32))
+CHUNK_MIN_TOKENS = int(os.environ.get("CHUNK_MIN_TOKENS", 48))
+
+
+def enqueue_literature_job(file_path, author, title, year, added_by):
+    """
+    Records a queued ingestion job for an uploaded PDF and returns it.
+    The PDF stays on disk until the job finishes, so failed jobs can be resumed.
+    """
+    job = IngestJob(
+        id=uuid.uuid4().hex,
+        status="queued",
+        file_path=file_path,
+        document_id=f"doc_{uuid.uuid4().hex[:8]}",
+        author=author,
+        title=title,
+        year=year,
+        added_by=added_by,
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def resume_job(job_id):
+    """
+    Puts a failed job back into the queue. Processing continues after the last committed chunk.
+    """
+    job = IngestJob.query.get(job_id)
+    if not job or job.status != "failed":
+        return None
+    job.status = "queued"
+    job.error = None
+    job.finished_at = None
+    db.session.commit()
+    return job
+
+
+def claim_next_job():
+    """
+    Atomically moves the oldest queued job to 'running' and returns it, or None if the queue is empty.
+    """
+    while True:
+        job = IngestJob.query.filter_by(status="queued").order_by(IngestJob.created_at).first()
+        if not job:
+            return None
+        claimed = IngestJob.query.filter_by(id=job.id, status="queued").update(
+            {
+                "status": "running",
+                "worker_pid": os.getpid(),
+                "started_at": datetime.utcnow(),
+                "updated_at": datetime.utcnow(),
+                "chunks_at_start": IngestJob.chunks_done,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        if claimed:
+            db.session.refresh(job)
+            return job
+        # Another worker claimed the job first, try the next one
+
+
+def fail_orphaned_jobs():
+    """
+    Marks 'running' jobs whose worker process no longer exists as failed, so they can be resumed.
+    """
+    for job in IngestJob.query.filter_by(status="running").all():
+        if job.worker_pid and _pid_alive(job.worker_pid):
+            continue
+        job.status = "failed"
+        job.error = "Worker process exited before the job finished."
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def run_literature_job(job):
+    """
+    Streams a PDF through extract -> chunk -> embed -> insert, committing progress after every batch.
+
+    Pages are extracted and chunked lazily, so only one batch of chunks is held in memory.
+    Chunks follow sentence boundaries, may span pages and record their page range.
+    Chunk ids are derived from the chunk position, so a resumed job skips the chunks
+    that were already committed and writes the remaining ones with the same ids.
+    The document's catalog entry is committed together with the job progress and is
+    only marked complete once the last chunk is written.
+    """
+    from app.chroma import get_collection, mark_collection_changed
+    from app.vectorizer import vectorize_texts, pooling_for, count_tokens
+    from app.utils.pdf_utils import extract_text_from_pdf_with_pages, count_pdf_pages
+    from app.utils.text_utils import chunk_pages
+    from app.lexical_index import get_lexical_index
+
+    collection = get_collection("literature")
+    pooling = pooling_for("literature")
+
+    job.total_pages = count_pdf_pages(job.file_path)
+    document = LiteratureDocument.query.get(job.document_id)
+    if document is None:
+        document = LiteratureDocument(
+            document_id=job.document_id,
+            author=job.author,
+            title=job.title,
+            year=job.year,
+            added_by=job.added_by,
+        )
+        db.session.add(document)
+    document.page_count = job.total_pages
+    document.byte_size = os.path.getsize(job.file_path)
+    document.complete = False
+    db.session.commit()
+
+    def pages():
+        for page_number, text in extract_text_from_pdf_with_pages(job.file_path):
+            job.pages_done = page_number
+            yield page_number, text
+
+    chunks = chunk_pages(
+        pages(), count_tokens,
+        max_tokens=CHUNK_MAX_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, min_tokens=CHUNK_MIN_TOKENS,
+    )
+    # Skip the chunks committed by an earlier run of this job
+    offset = job.chunks_done
+    chunks = itertools.islice(chunks, offset, None)
+
+    while True:
+        start = time.perf_counter()
+        batch = list(itertools.islice(chunks, JOB_BATCH_SIZE))
+        document.extract_seconds += time.perf_counter() - start
+        if not batch:
+            break
+        ids = [f"{job.document_id}_chunk_{offset + i + 1}" for i in range(len(batch))]
+        start = time.perf_counter()
+        embeddings = vectorize_texts([chunk["text"] for chunk in batch], pooling=pooling).tolist()
+        document.embed_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        collection.upsert(
+            ids=ids,
+            documents=[chunk["text"] for chunk in batch],
+            metadatas=[
+                {
+                    "chunk_id": chunk_id,
+                    "document_id": job.document_id,
+                    "author": job.author,
+                    "title": job.title,
+                    "year": job.year,
+                    "page_number": chunk["page_start"],
+                    "page_start": chunk["page_start"],
+                    "page_end": chunk["page_end"],
+                    "added_by": job.added_by,
+                }
+                for chunk_id, chunk in zip(ids, batch)
+            ],
+            embeddings=embeddings,
+        )
+        get_lexical_index().add_documents("literature", ids, [chunk["text"] for chunk in batch])
+        mark_collection_changed("literature")
+        document.write_seconds += time.perf_counter() - start
+        offset += len(batch)
+        job.chunks_done = offset
+        job.updated_at = datetime.utcnow()
+        document.chunk_count = offset
+        document.updated_at = job.updated_at
+        db.session.commit()
+        print(f"Job {job.id}: {job.chunks_done} chunks committed, page {job.pages_done}/{job.total_pages}")
+
+    job.total_chunks = job.chunks_done
+    document.chunk_count = job.chunks_done
+    document.complete = True
+    db.session.commit()
+
+
+def process_job(job):
+    """
+    Runs a claimed job and records its final state.
+    """
+    try:
+        run_literature_job(job)
+        job.status = "done"
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        if os.path.exists(job.file_path):
+            os.remove(job.file_path)
+    except Exception as e:
+        db.session.rollback()
+        job.status = "failed"
+        job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        print(f"Job {job.id} failed: {e}")
+
+
+def worker_loop(poll_interval=POLL_INTERVAL):
+    """
+    Polls the job table and processes queued jobs until the process is terminated.
+    """
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        print(f"Ingestion worker {os.getpid()} started")
+        while True:
+            job = claim_next_job()
+            if job is None:
+                time.sleep(poll_interval)
+                continue
+            print(f"Worker {os.getpid()} processing job {job.id}")
+            process_job(job)
+
+
+def start_workers(count=1):
+    """
+    Starts `count` worker processes after failing jobs orphaned by earlier workers.
+    Returns the started processes.
+    """
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        fail_orphaned_jobs()
+
+    # Spawn instead of fork so workers do not inherit the parent's model threads
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for _ in range(count):
+        process = context.Process(target=worker_loop)
+        process.start()
+        processes.append(process)
+    return processes
@@ -1,17 +1,15 @@
-from langchain_community.llms.ollama import Ollama
+import time
+from collections import deque
 from langchain.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
-from flask import current_app
+from app.object_cache import get_object_cache
+from app.context import pack_context
+from app.llm_gateway import get_llm_gateway, OLLAMA_MODEL
 
 #model = "deepseek-r1:14b"
-model = "llama3.1"
-# Singleton for LLM
-def get_llama_llm():
-    cache = current_app.config.get('CACHE', {})
-    if 'llama_llm' not in cache:
-        cache['llama_llm'] = Ollama(model=model)  # Ensure Ollama is running
-        current_app.config['CACHE'] = cache  # Update the cache in the app config
-    return cache['llama_llm']
+model = OLLAMA_MODEL
+
+# Timings of recent streamed answers, newest last
+RECENT_STREAMS = deque(maxlen=100)
 
 # Singleton for the Main Prompt Template
 def get_main_prompt_template():
@@ -19,8 +17,7 @@ def get_main_prompt_template():
     This is the final prompt (for the combined documents + user question).
     We define placeholders: {context} = merged documents, {question} = user's question.
     """
-    cache = current_app.config.get('CACHE', {})
-    if 'main_prompt_template' not in cache:
+    def build():
         main_prompt = """
         You are an expert research assistant. 
         You will answer research question related to the Decretum by Burchard of Worms.
@@ -37,62 +34,101 @@ def get_main_prompt_template():
 
         Answer:
         """
-        cache['main_prompt_template'] = PromptTemplate(
+        return PromptTemplate(
             template=main_prompt,
             # Must match the placeholders in the template
             input_variables=["context", "question","chapter_id"],
         )
-        current_app.config['CACHE'] = cache
-    return cache['main_prompt_template']
+    return get_object_cache().get_or_build('main_prompt_template', build)
 
 
-def get_document_prompt_template():
+def build_prompt(documents, query):
     """
-    This prompt template is used for each retrieved document. 
-    It inserts 'chapter_id' from doc.metadata plus the doc's page_content.
+    Fills the main prompt with the question and the retrieved documents, packed into
+    the context token budget with their citations.
+
+    Returns:
+        tuple: (prompt, context stats from pack_context).
     """
-    cache = current_app.config.get('CACHE', {})
-    if 'document_prompt_template' not in cache:
-        # We define placeholders: {page_content} and {metadata} 
-        # because the "stuff" chain passes each doc's page_content and metadata to this prompt.
-        doc_prompt = """
-        
-        {page_content}
-        """
-        cache['document_prompt_template'] = PromptTemplate(
-            template=doc_prompt,
-            # 'metadata' is a dictionary, 'page_content' is a string
-            input_variables=["page_content"]#, "metadata"],
-        )
-        current_app.config['CACHE'] = cache
-    return cache['document_prompt_template']
-
-
-# Singleton for the RetrievalQA Chain
-def get_rag_chain(retriever):
-    cache = current_app.config.get('CACHE', {})
-    chain_cache_key = f"rag_chain_{id(retriever)}"
-    if chain_cache_key not in cache:
-        llm = get_llama_llm()
-        main_prompt = get_main_prompt_template()        # Final prompt
-        print(main_prompt)
-        doc_prompt = get_document_prompt_template()     # Per-document prompt
-        print(doc_prompt)
-        # We override question_key="question" since your final prompt uses {question}
-        # We also specify the document_prompt so it includes chapter_id from metadata.
-        rag_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            retriever=retriever,
-            chain_type="stuff",
-            chain_type_kwargs={
-                "prompt": main_prompt,
-                "document_prompt": doc_prompt,         # custom doc-level prompt
-                
-            },
-            return_source_documents=True,
-        )
-        cache[chain_cache_key] = rag_chain
-        current_app.config['CACHE'] = cache  # Update the cache in the app config
-    return cache[chain_cache_key]
+    from app.vectorizer import count_tokens
+
+    context, stats = pack_context(documents, count_tokens)
+    return get_main_prompt_template().format(context=context, question=query), stats
+
+
+def generate_answer(prompt, user="anonymous"):
+    """
+    Returns the LLM completion of a prompt and Ollama's prompt evaluation counters
+    ('prompt_eval_count' tokens and 'prompt_eval_seconds'), if reported.
+    The request waits in the LLM gateway queue for a free slot.
+    """
+    text, info = get_llm_gateway().generate(prompt, user)
+    return text, {"prompt_eval_count": info["prompt_eval_count"], "prompt_eval_seconds": info["prompt_eval_seconds"]}
+
+
+def stream_answer(prompt, user="anonymous"):
+    """
+    Streams the LLM completion of a prompt. Yields ('queued', position) while waiting in
+    the LLM gateway queue, ('token', text) for every chunk the LLM produces, then
+    ('done', stats) with time to first token and tokens per second. Ollama streams one
+    token per chunk, so chunks are counted as tokens. Time to first token starts once
+    a slot is free; the queue wait is reported separately.
+    """
+    start = time.perf_counter()
+    queue_seconds = 0.0
+    first_token = None
+    tokens = 0
+    counters = {}
+    # Closing this generator closes the gateway stream right away, which frees its slot
+    inner = get_llm_gateway().stream(prompt, user)
+    try:
+        for kind, chunk in inner:
+            if kind == "queued":
+                yield kind, chunk
+                continue
+            if kind == "started":
+                start = time.perf_counter()
+                queue_seconds = chunk
+                continue
+            if kind == "done":
+                counters = chunk
+                continue
+            if first_token is None:
+                first_token = time.perf_counter()
+            tokens += 1
+            yield "token", chunk
+    finally:
+        inner.close()
+    end = time.perf_counter()
+
+    generation_seconds = end - first_token if first_token else 0.0
+    stats = {
+        "model": model,
+        "queue_seconds": round(queue_seconds, 4),
+        "ttft_seconds": round(first_token - start, 4) if first_token else None,
+        "tokens": tokens,
+        "tokens_per_second": round((tokens - 1) / generation_seconds, 2) if tokens > 1 and generation_seconds else None,
+        "total_seconds": round(end - start, 4),
+        "prompt_eval_count": counters.get("prompt_eval_count"),
+        "prompt_eval_seconds": counters.get("prompt_eval_seconds"),
+    }
+    RECENT_STREAMS.append(stats)
+    print(f"LLM stream: {tokens} tokens, TTFT {stats['ttft_seconds']}s, {stats['tokens_per_second']} tok/s")
+    yield "done", stats
+
+
+def stream_stats():
+    """
+    Summarizes the timings of recent streamed answers.
+    """
+    streams = list(RECENT_STREAMS)
+    ttfts = [s["ttft_seconds"] for s in streams if s["ttft_seconds"] is not None]
+    rates = [s["tokens_per_second"] for s in streams if s["tokens_per_second"] is not None]
+    return {
+        "requests": len(streams),
+        "mean_ttft_seconds": round(sum(ttfts) / len(ttfts), 4) if ttfts else None,
+        "mean_tokens_per_second": round(sum(rates) / len(rates), 2) if rates else None,
+        "recent": streams[-10:],
+    }
 
 # https://github.com/langchain-ai/langchain/issues/1136
\ No newline at end of file
@@ -0,0 +1,197 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+# Location of the on-disk inverted index
+LEXICAL_INDEX_PATH = os.environ.get("LEXICAL_INDEX_PATH", "./data/lexical_index.db")
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """
+    Lowercases a text, strips diacritics and folds Latin spelling variants (j -> i, v -> u),
+    so lemmatized and classical spellings match. Returns the list of terms.
+    """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [term.replace("j", "i").replace("v", "u") for term in _TOKEN.findall(text)]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index stored in SQLite, updated incrementally as documents are
+    added or deleted. Each Chroma collection has its own postings.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                collection TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (collection, doc_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                collection TEXT NOT NULL,
+                term TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (collection, term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings (collection, doc_id);
+            CREATE TABLE IF NOT EXISTS collection_stats (
+                collection TEXT PRIMARY KEY,
+                doc_count INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            """
+        )
+        connection.commit()
+
+    def _connection(self):
+        # SQLite connections cannot be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _remove(self, connection, collection, doc_ids):
+        removed_docs = 0
+        removed_length = 0
+        for doc_id in doc_ids:
+            row = connection.execute(
+                "SELECT length FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+            ).fetchone()
+            if row is None:
+                continue
+            connection.execute("DELETE FROM postings WHERE collection = ? AND doc_id = ?", (collection, doc_id))
+            connection.execute("DELETE FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id))
+            removed_docs += 1
+            removed_length += row[0]
+        return removed_docs, removed_length
+
+    def _update_stats(self, connection, collection, doc_delta, length_delta):
+        connection.execute(
+            """
+            INSERT INTO collection_stats (collection, doc_count, total_length) VALUES (?, ?, ?)
+            ON CONFLICT (collection) DO UPDATE SET
+                doc_count = doc_count + excluded.doc_count,
+                total_length = total_length + excluded.total_length
+            """,
+            (collection, doc_delta, length_delta),
+        )
+
+    def add_documents(self, collection, doc_ids, texts):
+        """
+        Indexes documents, replacing earlier versions with the same ids.
+        """
+        connection = self._connection()
+        with connection:
+            removed_docs, removed_length = self._remove(connection, collection, doc_ids)
+            added_length = 0
+            for doc_id, text in zip(doc_ids, texts):
+                terms = Counter(tokenize(text))
+                length = sum(terms.values())
+                connection.execute(
+                    "INSERT OR REPLACE INTO documents (collection, doc_id, length) VALUES (?, ?, ?)",
+                    (collection, doc_id, length),
+                )
+                connection.executemany(
+                    "INSERT OR REPLACE INTO postings (collection, term, doc_id, tf) VALUES (?, ?, ?, ?)",
+                    [(collection, term, doc_id, tf) for term, tf in terms.items()],
+                )
+                added_length += length
+            self._update_stats(connection, collection, len(doc_ids) - removed_docs, added_length - removed_length)
+
+    def delete_documents(self, collection, doc_ids):
+        """
+        Removes documents from the index.
+        """
+        connection = self._connection()
+        with connection:
+            removed_docs, removed_length = self._remove(connection, collection, doc_ids)
+            self._update_stats(connection, collection, -removed_docs, -removed_length)
+
+    def clear(self, collection):
+        """
+        Removes all documents of a collection from the index.
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM postings WHERE collection = ?", (collection,))
+            connection.execute("DELETE FROM documents WHERE collection = ?", (collection,))
+            connection.execute("DELETE FROM collection_stats WHERE collection = ?", (collection,))
+
+    def contains(self, collection, doc_id):
+        """
+        True if a document with exactly this id is indexed.
+        """
+        return self._connection().execute(
+            "SELECT 1 FROM documents WHERE collection = ? AND doc_id = ?", (collection, doc_id)
+        ).fetchone() is not None
+
+    def search(self, collection, query, k=10):
+        """
+        Returns up to k (doc_id, BM25 score) pairs for a query, best first.
+        """
+        connection = self._connection()
+        stats = connection.execute(
+            "SELECT doc_count, total_length FROM collection_stats WHERE collection = ?", (collection,)
+        ).fetchone()
+        if not stats or not stats[0]:
+            return []
+        doc_count, total_length = stats
+        average_length = total_length / doc_count
+
+        scores = Counter()
+        for term in set(tokenize(query)):
+            postings = connection.execute(
+                """
+                SELECT p.doc_id, p.tf, d.length FROM postings p
+                JOIN documents d ON d.collection = p.collection AND d.doc_id = p.doc_id
+                WHERE p.collection = ? AND p.term = ?
+                """,
+                (collection, term),
+            ).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf, length in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_lexical_index():
+    """
+    Returns the process-wide lexical index.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LexicalIndex()
+    return _index
@@ -0,0 +1,347 @@
+import os
+import json
+import time
+import queue
+import threading
+import http.client
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+# Ollama server and model; point OLLAMA_BASE_URL at fake_ollama.py to run without a model
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.1")
+# Generations running in Ollama at the same time; more requests wait in the queue
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 1))
+# Waiting requests beyond this are rejected right away
+LLM_QUEUE_LIMIT = int(os.environ.get("LLM_QUEUE_LIMIT", 32))
+# Seconds a request may wait for a slot
+LLM_QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", 120))
+# Seconds without data from Ollama before a generation is aborted
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", 300))
+# Seconds between queue position updates of waiting streamed requests
+QUEUE_POLL_INTERVAL = 1.0
+
+
+class LLMGatewayError(RuntimeError):
+    """
+    Raised when a generation request cannot be served.
+    """
+
+
+class LLMOverloaded(LLMGatewayError):
+    """
+    Raised when the queue is full or a request waited longer than the queue timeout.
+    """
+
+
+class _Ticket:
+    """
+    A generation request waiting for or holding a slot.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.waited = 0.0
+
+
+class _ConnectionPool:
+    """
+    Keeps idle HTTP connections to Ollama for reuse. A connection is discarded instead
+    of returned if a response was not read to the end (e.g. a cancelled generation).
+    """
+
+    def __init__(self, base_url, size, timeout):
+        url = urlparse(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.https = url.scheme == "https"
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.created = 0
+
+    def get(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            self.created += 1
+            connection_class = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def put(self, connection):
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def discard(self, connection):
+        connection.close()
+
+
+class LLMGateway:
+    """
+    Schedules generation requests to Ollama.
+
+    At most `max_concurrency` generations run at once. Waiting requests are queued per
+    user and slots are handed out round-robin over users, so one user submitting many
+    questions does not starve the others. Requests are rejected when the queue is full
+    or after waiting `queue_timeout` seconds. Streamed requests that are abandoned by
+    the client (the generator is closed) leave the queue or close their connection,
+    which stops the generation in Ollama.
+    """
+
+    def __init__(self, base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL, max_concurrency=LLM_MAX_CONCURRENCY,
+                 queue_limit=LLM_QUEUE_LIMIT, queue_timeout=LLM_QUEUE_TIMEOUT, request_timeout=LLM_REQUEST_TIMEOUT,
+                 poll_interval=QUEUE_POLL_INTERVAL):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.queue_limit = queue_limit
+        self.queue_timeout = queue_timeout
+        self.poll_interval = poll_interval
+        self.pool = _ConnectionPool(base_url, max_concurrency, request_timeout)
+        self._condition = threading.Condition()
+        self._queues = OrderedDict()  # user -> deque of waiting tickets, in round-robin order
+        self._queued = 0
+        self._active = 0
+        self.requests = 0
+        self.completed = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.cancelled = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.queue_waits = deque(maxlen=2048)
+        self.generation_times = deque(maxlen=2048)
+
+    # Scheduling
+
+    def _enqueue(self, user):
+        with self._condition:
+            self.requests += 1
+            if self._queued >= self.queue_limit:
+                self.rejected["queue_full"] += 1
+                raise LLMOverloaded(f"The LLM queue is full ({self._queued} waiting requests)")
+            ticket = _Ticket(user)
+            self._queues.setdefault(user, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+            return ticket
+
+    def _dispatch(self):
+        # Caller holds self._condition
+        while self._active < self.max_concurrency and self._queues:
+            user, tickets = next(iter(self._queues.items()))
+            ticket = tickets.popleft()
+            del self._queues[user]
+            if tickets:
+                # The user goes to the back of the round-robin order
+                self._queues[user] = tickets
+            self._queued -= 1
+            self._active += 1
+            ticket.granted = True
+        self._condition.notify_all()
+
+    def _withdraw(self, ticket):
+        # Caller holds self._condition
+        tickets = self._queues.get(ticket.user)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._queued -= 1
+            if not tickets:
+                del self._queues[ticket.user]
+
+    def _position(self, ticket):
+        # Caller holds self._condition; number of requests granted before this one at the current rate
+        for tickets in self._queues.values():
+            if ticket in tickets:
+                return tickets.index(ticket) * len(self._queues) + 1
+        return 0
+
+    def _wait(self, ticket):
+        """
+        Blocks until the ticket holds a slot. Yields the queue position every
+        `poll_interval` seconds while waiting, so streaming callers can report
+        progress and notice disconnected clients.
+        """
+        deadline = ticket.enqueued + self.queue_timeout
+        try:
+            with self._condition:
+                while not ticket.granted:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self._withdraw(ticket)
+                        self.rejected["queue_timeout"] += 1
+                        raise LLMOverloaded(f"No LLM slot became free within {self.queue_timeout:g} s")
+                    self._condition.wait(min(remaining, self.poll_interval))
+                    if not ticket.granted:
+                        position = self._position(ticket)
+                        self._condition.release()
+                        try:
+                            yield position
+                        finally:
+                            self._condition.acquire()
+        except GeneratorExit:
+            # The caller went away while waiting
+            with self._condition:
+                if ticket.granted:
+                    self._release_locked()
+                else:
+                    self._withdraw(ticket)
+                self.cancelled += 1
+            raise
+        ticket.waited = time.perf_counter() - ticket.enqueued
+        self.queue_waits.append(ticket.waited)
+
+    def _release_locked(self):
+        # Caller holds self._condition
+        self._active -= 1
+        self._dispatch()
+
+    def _release(self):
+        with self._condition:
+            self._release_locked()
+
+    # Ollama requests
+
+    def _post(self, connection, payload):
+        body = json.dumps(payload).encode("utf-8")
+        connection.request("POST", "/api/generate", body=body, headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        if response.status != 200:
+            message = response.read().decode("utf-8", "replace")
+            raise LLMGatewayError(f"Ollama returned HTTP {response.status}: {message}")
+        return response
+
+    @staticmethod
+    def _counters(info):
+        return {
+            "prompt_eval_count": info.get("prompt_eval_count"),
+            "prompt_eval_seconds": info["prompt_eval_duration"] / 1e9 if info.get("prompt_eval_duration") else None,
+            "eval_count": info.get("eval_count"),
+        }
+
+    def generate(self, prompt, user="anonymous"):
+        """
+        Returns the completion of a prompt and Ollama's counters, waiting for a slot first.
+        """
+        ticket = self._enqueue(user)
+        for _ in self._wait(ticket):
+            pass
+
+        start = time.perf_counter()
+        connection = self.pool.get()
+        reusable = False
+        try:
+            response = self._post(connection, {"model": self.model, "prompt": prompt, "stream": False})
+            info = json.loads(response.read())
+            reusable = True
+            self.completed += 1
+            self.generation_times.append(time.perf_counter() - start)
+            return info.get("response", ""), self._counters(info)
+        except TimeoutError:
+            self.timeouts += 1
+            raise LLMGatewayError(f"Ollama sent no data for {self.pool.timeout:g} s")
+        except Exception as e:
+            self.errors += 1
+            if isinstance(e, LLMGatewayError):
+                raise
+            raise LLMGatewayError(f"Ollama request failed: {e}")
+        finally:
+            (self.pool.put if reusable else self.pool.discard)(connection)
+            self._release()
+
+    def stream(self, prompt, user="anonymous"):
+        """
+        Streams the completion of a prompt. Yields ('queued', position) while waiting for
+        a slot, ('started', seconds waited) once it holds one, ('token', text) for every
+        token and finally ('done', counters).
+        Closing the generator cancels the request, queued or running.
+        """
+        ticket = self._enqueue(user)
+        for position in self._wait(ticket):
+            yield "queued", position
+
+        start = time.perf_counter()
+        connection = self.pool.get()
+        reusable = False
+        try:
+            yield "started", ticket.waited
+            response = self._post(connection, {"model": self.model, "prompt": prompt, "stream": True})
+            while True:
+                line = response.readline()
+                if not line:
+                    raise LLMGatewayError("Ollama closed the stream before it was done")
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise LLMGatewayError(f"Ollama error: {chunk['error']}")
+                if chunk.get("done"):
+                    response.read()
+                    reusable = True
+                    self.completed += 1
+                    self.generation_times.append(time.perf_counter() - start)
+                    yield "done", self._counters(chunk)
+                    return
+                if chunk.get("response"):
+                    yield "token", chunk["response"]
+        except GeneratorExit:
+            # Closing the connection makes Ollama stop generating
+            self.cancelled += 1
+            raise
+        except TimeoutError:
+            self.timeouts += 1
+            raise LLMGatewayError(f"Ollama sent no data for {self.pool.timeout:g} s")
+        except LLMGatewayError:
+            self.errors += 1
+            raise
+        except Exception as e:
+            self.errors += 1
+            raise LLMGatewayError(f"Ollama request failed: {e}")
+        finally:
+            (self.pool.put if reusable else self.pool.discard)(connection)
+            self._release()
+
+    def stats(self):
+        def percentile(values, p):
+            values = sorted(values)
+            if not values:
+                return None
+            return round(values[min(len(values) - 1, int(p * len(values)))], 3)
+
+        with self._condition:
+            waiting = {user: len(tickets) for user, tickets in self._queues.items()}
+            active = self._active
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": active,
+            "queued": sum(waiting.values()),
+            "queued_per_user": waiting,
+            "requests": self.requests,
+            "completed": self.completed,
+            "rejected": dict(self.rejected),
+            "cancelled": self.cancelled,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "queue_wait_p50_seconds": percentile(self.queue_waits, 0.50),
+            "queue_wait_p99_seconds": percentile(self.queue_waits, 0.99),
+            "generation_p50_seconds": percentile(self.generation_times, 0.50),
+            "generation_p99_seconds": percentile(self.generation_times, 0.99),
+            "connections_created": self.pool.created,
+        }
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway():
+    """
+    Returns the process-wide LLM gateway.
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
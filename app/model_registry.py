@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+
+
+def resident_memory_bytes():
+    """
+    Returns the resident set size of the current process in bytes, or None if unknown.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak RSS in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Loads models lazily on first use and shares one instance per name within the process.
+
+    Loaders are registered with a name and called at most once, under a per-model lock,
+    so concurrent first requests do not load the same weights twice. Load time and the
+    growth of resident memory during loading are recorded for every model.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._locks = {}
+        self._stats = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name, loader):
+        """
+        Registers a zero-argument callable that builds the model called `name`.
+        """
+        with self._registry_lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """
+        Returns the model called `name`, loading it on first use.
+        """
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited for the lock
+            if name in self._models:
+                return self._models[name]
+
+            print(f"Loading model '{name}'")
+            memory_before = resident_memory_bytes()
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            load_seconds = time.perf_counter() - start
+            memory_after = resident_memory_bytes()
+
+            self._models[name] = model
+            self._stats[name] = {
+                "load_seconds": round(load_seconds, 3),
+                "resident_megabytes": (
+                    round((memory_after - memory_before) / (1024 * 1024), 1)
+                    if memory_before is not None and memory_after is not None else None
+                ),
+                "loaded_at": time.time(),
+            }
+            print(f"Model '{name}' loaded in {load_seconds:.2f}s")
+            return model
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def stats(self):
+        """
+        Returns load time and resident memory per model, plus the process RSS.
+        """
+        process_memory = resident_memory_bytes()
+        return {
+            "models": {
+                name: {"loaded": name in self._models, **self._stats.get(name, {})}
+                for name in self._loaders
+            },
+            "process_resident_megabytes": round(process_memory / (1024 * 1024), 1) if process_memory else None,
+        }
+
+
+registry = ModelRegistry()
@@ -2,6 +2,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import db
+from datetime import datetime
 
 roles_users = db.Table(
     'roles_users',
@@ -28,3 +29,82 @@ class User(db.Model, UserMixin):
 
     def has_role(self, role_name):
         return any(role.name == role_name for role in self.roles)
+
+
+class IngestJob(db.Model):
+    """
+    A background ingestion job for an uploaded PDF, processed by the workers in app/jobs.py.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    file_path = db.Column(db.String(255), nullable=False)
+    document_id = db.Column(db.String(50), nullable=False)
+    author = db.Column(db.String(255), nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    year = db.Column(db.String(20), nullable=False)
+    added_by = db.Column(db.String(50), nullable=False)
+    total_pages = db.Column(db.Integer)
+    pages_done = db.Column(db.Integer, nullable=False, default=0)  # Pages chunked so far
+    total_chunks = db.Column(db.Integer)  # Known once all pages are chunked
+    chunks_done = db.Column(db.Integer, nullable=False, default=0)  # Chunks committed to Chroma
+    chunks_at_start = db.Column(db.Integer, nullable=False, default=0)  # chunks_done when the current run started
+    error = db.Column(db.Text)
+    worker_pid = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def progress(self):
+        """
+        Returns the job state as a JSON-serializable dict, including throughput in chunks per second.
+        Throughput only counts the chunks of the current run, since started_at is reset on resume.
+        """
+        elapsed = None
+        throughput = None
+        if self.started_at:
+            end = self.finished_at or self.updated_at or self.started_at
+            elapsed = (end - self.started_at).total_seconds()
+            if elapsed > 0:
+                throughput = round((self.chunks_done - (self.chunks_at_start or 0)) / elapsed, 2)
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "document_id": self.document_id,
+            "title": self.title,
+            "total_pages": self.total_pages,
+            "pages_done": self.pages_done,
+            "total_chunks": self.total_chunks,
+            "chunks_done": self.chunks_done,
+            "elapsed_seconds": elapsed,
+            "chunks_per_second": throughput,
+            "error": self.error,
+        }
+
+
+class LiteratureDocument(db.Model):
+    """
+    Catalog entry of an ingested PDF in the literature collection, maintained by the
+    ingestion workers in the same transaction as the job progress. Entries of jobs that
+    are still running or failed have `complete` unset and only part of their chunks.
+    """
+    document_id = db.Column(db.String(50), primary_key=True)
+    author = db.Column(db.String(255), nullable=False)
+    title = db.Column(db.String(255), nullable=False)
+    year = db.Column(db.String(20), nullable=False)
+    added_by = db.Column(db.String(50), nullable=False)
+    chunk_count = db.Column(db.Integer, nullable=False, default=0)  # Chunks <document_id>_chunk_1..n in Chroma
+    page_count = db.Column(db.Integer)
+    byte_size = db.Column(db.Integer)  # Size of the uploaded PDF
+    complete = db.Column(db.Boolean, nullable=False, default=False)  # Set once all chunks are written
+    extract_seconds = db.Column(db.Float, nullable=False, default=0.0)  # Text extraction and chunking
+    embed_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    write_seconds = db.Column(db.Float, nullable=False, default=0.0)  # Chroma and lexical index writes
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime)
+
+    def chunk_ids(self):
+        """
+        Returns the ids of the document's chunks, which are numbered consecutively from 1.
+        """
+        return [f"{self.document_id}_chunk_{i}" for i in range(1, self.chunk_count + 1)]
@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app
+
+# Objects (vector stores, retrievers, prompt templates) kept per process
+OBJECT_CACHE_MAX_ENTRIES = int(os.environ.get("OBJECT_CACHE_MAX_ENTRIES", 32))
+
+
+class _Entry:
+    def __init__(self, value, build_seconds):
+        self.value = value
+        self.build_seconds = build_seconds
+        self.created = time.time()
+        self.hits = 0
+
+
+class ObjectCache:
+    """
+    Thread-safe LRU cache of objects that are expensive to build.
+
+    get_or_build() builds a missing object once: concurrent requests for the same key
+    wait on a per-key lock instead of building duplicates, while other keys are served
+    in parallel. When more than `max_entries` objects are cached, the least recently
+    used one is dropped.
+    """
+
+    def __init__(self, max_entries=OBJECT_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+        self.build_seconds = 0.0
+
+    def _lookup(self, key):
+        # Caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self.hits += 1
+        return entry
+
+    def get_or_build(self, key, build):
+        """
+        Returns the object cached under `key`, calling `build()` to create it if missing.
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                return entry.value
+            self.misses += 1
+            # [lock, number of threads holding or waiting for it]
+            build_lock = self._build_locks.setdefault(key, [threading.Lock(), 0])
+            build_lock[1] += 1
+
+        try:
+            with build_lock[0]:
+                # Another thread may have built the object while this one waited
+                with self._lock:
+                    entry = self._lookup(key)
+                    if entry is not None:
+                        return entry.value
+
+                start = time.perf_counter()
+                value = build()
+                seconds = time.perf_counter() - start
+
+                with self._lock:
+                    self._entries[key] = _Entry(value, seconds)
+                    self._entries.move_to_end(key)
+                    self.builds += 1
+                    self.build_seconds += seconds
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+                return value
+        finally:
+            # The lock is dropped by the last thread using it, also when build() raised,
+            # so a thread arriving later never builds next to one still holding the old lock
+            with self._lock:
+                build_lock[1] -= 1
+                if not build_lock[1]:
+                    self._build_locks.pop(key, None)
+
+    def invalidate(self, prefix=""):
+        """
+        Drops every object whose key starts with `prefix`. Returns the number dropped.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "builds": self.builds,
+                "evictions": self.evictions,
+                "build_seconds": round(self.build_seconds, 4),
+                # Least recently used first
+                "objects": [
+                    {
+                        "key": key,
+                        "build_seconds": round(entry.build_seconds, 4),
+                        "hits": entry.hits,
+                        "age_seconds": round(time.time() - entry.created, 1),
+                    }
+                    for key, entry in self._entries.items()
+                ],
+            }
+
+
+def get_object_cache():
+    """
+    Returns the object cache of the current Flask app.
+    """
+    return current_app.extensions["object_cache"]
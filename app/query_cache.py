@@ -0,0 +1,99 @@
+import os
+import threading
+from collections import OrderedDict
+
+# Number of query embeddings and search results kept in memory
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+SEARCH_RESULT_CACHE_SIZE = int(os.environ.get("SEARCH_RESULT_CACHE_SIZE", 512))
+QUERY_CACHE_ENABLED = os.environ.get("QUERY_CACHE_ENABLED", "true").lower() == "true"
+
+
+class _LRU:
+    """
+    Bounded mapping that evicts the least recently used entry. Every entry remembers
+    the seconds it took to compute, which a hit reports as saved latency.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def put(self, key, value, seconds):
+        with self._lock:
+            self._entries[key] = (value, seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "saved_seconds": round(self.saved_seconds, 4),
+        }
+
+
+class QueryCache:
+    """
+    Two-level cache of `search_collection` lookups.
+
+    `embeddings` maps (embedding model, query) to the query vector. `results` maps
+    (collection, embedding model, query, n_results, collection version) to the ranked
+    results; writes to a collection change its version, so stale results are never hit
+    and age out of the LRU.
+    """
+
+    def __init__(self, embedding_size=QUERY_EMBEDDING_CACHE_SIZE, result_size=SEARCH_RESULT_CACHE_SIZE):
+        self.embeddings = _LRU(embedding_size)
+        self.results = _LRU(result_size)
+
+    def clear(self):
+        self.embeddings.clear()
+        self.results.clear()
+
+    def stats(self):
+        return {"embeddings": self.embeddings.stats(), "results": self.results.stats()}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """
+    Returns the process-wide query cache, or None if QUERY_CACHE_ENABLED is false.
+    """
+    global _cache
+    if not QUERY_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryCache()
+    return _cache
@@ -0,0 +1,173 @@
+import time
+from langchain_core.documents import Document
+from app.answer_cache import get_answer_cache
+from app.chroma import get_collection_version
+from app.langchain import generate_answer, build_prompt, stream_answer
+from app.retrieval import embed_question, fetch_in_order, lexical_only, QUESTION_MODEL_KEY
+
+# Stages of a RAG request, in execution order
+STAGES = ("embed", "search", "rerank", "prompt", "generation")
+
+
+def _log_timings(query, timings, cached=False, context=None, prompt_eval=None):
+    stages = ", ".join(f"{stage} {timings.get(stage, 0.0) * 1000:.1f} ms" for stage in STAGES)
+    print(f"RAG '{query[:60]}'{' (cached answer)' if cached else ''}: {stages}")
+    if context:
+        print(
+            f"RAG context: {context['passages']} passages from {context['documents']} documents "
+            f"({context['merged']} merged, {context['dropped']} dropped, {context['truncated']} truncated), "
+            f"{context['tokens']}/{context['budget']} tokens"
+        )
+    if prompt_eval:
+        seconds = prompt_eval.get("prompt_eval_seconds")
+        print(
+            f"RAG prompt eval: {prompt_eval.get('prompt_eval_count')} prompt tokens in "
+            f"{f'{seconds:.2f}' if seconds is not None else '?'} s"
+        )
+
+
+def source_id(document):
+    """
+    Returns the Chroma id of a retrieved document from its metadata.
+    """
+    metadata = document.metadata or {}
+    return metadata.get("chunk_id") or metadata.get("chapter_id") or metadata.get("id")
+
+
+def _lexical_only(retriever, query, timings):
+    # Looked up once per request; both the answer cache and retrieval need the result
+    start = time.perf_counter()
+    lexical_ids = lexical_only(retriever.collection_name, query)
+    timings["search"] = timings.get("search", 0.0) + time.perf_counter() - start
+    return lexical_ids
+
+
+class _CacheContext:
+    """
+    Looks up a question in the semantic answer cache and stores the answer on a miss.
+    """
+
+    def __init__(self, retriever, query, lexical_ids, timings):
+        self.cache = get_answer_cache()
+        self.entry = None
+        if self.cache is None:
+            return
+        self.query = query
+        start = time.perf_counter()
+        if lexical_ids is not None:
+            # Exact ids are retrieved without a forward pass, so the answer is
+            # looked up by question text instead of embedding the question for this
+            model, self.embedding = "exact", None
+        else:
+            # For sources, the question embedding is also the retrieval embedding
+            self.embedding = embed_question(query)
+            timings["embed"] = timings.get("embed", 0.0) + time.perf_counter() - start
+            model = QUESTION_MODEL_KEY
+        self.key = (
+            retriever.collection_name,
+            get_collection_version(retriever.collection_name),
+            model,
+            retriever.k,
+        )
+        self.entry = self.cache.lookup(*self.key, self.embedding, question=query)
+
+    def documents(self, retriever, timings):
+        # Cached answers only keep source ids; the documents are fetched by primary key
+        start = time.perf_counter()
+        documents = [
+            Document(page_content=document or "", metadata=metadata or {})
+            for _, document, metadata in fetch_in_order(retriever.vectorstore._collection, self.entry.source_ids)
+        ]
+        timings["search"] = timings.get("search", 0.0) + time.perf_counter() - start
+        return documents
+
+    def store(self, answer, documents, generation_seconds):
+        if self.cache is not None:
+            source_ids = [source_id(document) for document in documents]
+            self.cache.store(*self.key, self.query, self.embedding, answer,
+                             [doc_id for doc_id in source_ids if doc_id], generation_seconds)
+
+
+def answer_question(retriever, query, user="anonymous"):
+    """
+    Answers a question with one retrieval: the retrieved documents are used for the
+    prompt and returned for display, as RetrievalQA does with return_source_documents.
+    Near-identical earlier questions are answered from the semantic answer cache.
+
+    Returns:
+        dict: 'result' (answer), 'source_documents', 'timings' (seconds per stage), 'cached',
+        and for generated answers 'context' (packing stats) and 'prompt_eval' (Ollama counters).
+    """
+    timings = {}
+    lexical_ids = _lexical_only(retriever, query, timings)
+    cached = _CacheContext(retriever, query, lexical_ids, timings)
+    if cached.entry is not None:
+        documents = cached.documents(retriever, timings)
+        _log_timings(query, timings, cached=True)
+        return {"result": cached.entry.answer, "source_documents": documents, "timings": timings, "cached": True}
+
+    documents = retriever.retrieve(query, timings, lexical_ids)
+
+    start = time.perf_counter()
+    prompt, context = build_prompt(documents, query)
+    timings["prompt"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    answer, prompt_eval = generate_answer(prompt, user)
+    timings["generation"] = time.perf_counter() - start
+
+    cached.store(answer, documents, timings["generation"])
+    _log_timings(query, timings, context=context, prompt_eval=prompt_eval)
+    return {"result": answer, "source_documents": documents, "timings": timings, "cached": False,
+            "context": context, "prompt_eval": prompt_eval}
+
+
+def stream_question(retriever, query, user="anonymous"):
+    """
+    Streaming variant of answer_question. Yields ('documents', documents) after retrieval,
+    ('queued', position) while waiting for the LLM, ('token', text) while the answer is
+    generated and finally ('done', stats), where stats includes the per-stage timings.
+    A cached answer is sent as a single token.
+    """
+    timings = {}
+    lexical_ids = _lexical_only(retriever, query, timings)
+    cached = _CacheContext(retriever, query, lexical_ids, timings)
+    if cached.entry is not None:
+        yield "documents", cached.documents(retriever, timings)
+        yield "token", cached.entry.answer
+        _log_timings(query, timings, cached=True)
+        yield "done", {
+            "cached": True,
+            "saved_seconds": round(cached.entry.generation_seconds, 4),
+            "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        }
+        return
+
+    documents = retriever.retrieve(query, timings, lexical_ids)
+    yield "documents", documents
+
+    start = time.perf_counter()
+    prompt, context = build_prompt(documents, query)
+    timings["prompt"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tokens = []
+    inner = stream_answer(prompt, user)
+    try:
+        for kind, data in inner:
+            if kind == "queued":
+                yield kind, data
+            elif kind == "token":
+                tokens.append(data)
+                yield kind, data
+            else:
+                # Time spent waiting for an LLM slot is not generation time
+                timings["generation"] = time.perf_counter() - start - data["queue_seconds"]
+                cached.store("".join(tokens), documents, timings["generation"])
+                prompt_eval = {"prompt_eval_count": data["prompt_eval_count"], "prompt_eval_seconds": data["prompt_eval_seconds"]}
+                _log_timings(query, timings, context=context, prompt_eval=prompt_eval)
+                yield "done", {**data, "cached": False, "context": context,
+                               "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()}}
+    finally:
+        # A client that disconnects closes this generator; pass that on to the LLM gateway
+        inner.close()
@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from app.embedding_cache import text_hash
+from app.model_registry import registry
+
+# Cross-encoder scoring (query, passage) pairs. The default is trained on mMARCO, the
+# machine-translated MS MARCO, so it also scores the German and Latin texts; English-only
+# MS MARCO models would reorder those results almost at random.
+RERANKER_MODEL_NAME = os.environ.get("RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_ENABLED = os.environ.get("RERANK_ENABLED", "true").lower() == "true"
+# Candidates retrieved before reranking; the best k of them reach the prompt
+RERANK_CANDIDATES = int(os.environ.get("RERANK_CANDIDATES", 20))
+RERANK_BATCH_SIZE = int(os.environ.get("RERANK_BATCH_SIZE", 16))
+# (query, passage) scores kept in memory
+RERANK_CACHE_SIZE = int(os.environ.get("RERANK_CACHE_SIZE", 8192))
+
+
+def _load_cross_encoder():
+    from sentence_transformers import CrossEncoder
+
+    # Small enough to run on CPU next to the LLM
+    return CrossEncoder(RERANKER_MODEL_NAME, device="cpu", max_length=512)
+
+
+registry.register(f"{RERANKER_MODEL_NAME}:cross-encoder", _load_cross_encoder)
+
+
+class Reranker:
+    """
+    Scores candidate passages against a query with a cross-encoder, in batches.
+    Scores are cached by (query, passage) hash, so repeated questions and passages
+    retrieved again for similar questions are not re-scored.
+    """
+
+    def __init__(self, cache_size=RERANK_CACHE_SIZE, batch_size=RERANK_BATCH_SIZE):
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+        self.pairs = 0
+        self.cached_pairs = 0
+        self.seconds = 0.0
+
+    def score(self, query, texts):
+        """
+        Returns the relevance score of every text for the query.
+        """
+        query_key = text_hash(query)
+        keys = [(query_key, text_hash(text)) for text in texts]
+        scores = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    scores[i] = self._scores[key]
+
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            start = time.perf_counter()
+            model = registry.get(f"{RERANKER_MODEL_NAME}:cross-encoder")
+            predicted = model.predict(
+                [(query, texts[i]) for i in missing], batch_size=self.batch_size, show_progress_bar=False
+            )
+            self.seconds += time.perf_counter() - start
+            with self._lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self._scores[keys[i]] = scores[i]
+                while len(self._scores) > self.cache_size:
+                    self._scores.popitem(last=False)
+
+        self.pairs += len(texts)
+        self.cached_pairs += len(texts) - len(missing)
+        return scores
+
+    def rerank(self, query, documents, top_n):
+        """
+        Returns the top_n LangChain documents by cross-encoder score, best first,
+        with the score stored in metadata['rerank_score'].
+        """
+        if not documents:
+            return []
+        scores = self.score(query, [doc.page_content for doc in documents])
+        ranked = sorted(zip(scores, range(len(documents))), key=lambda pair: pair[0], reverse=True)
+        best = []
+        for score, i in ranked[:top_n]:
+            document = documents[i]
+            document.metadata = {**(document.metadata or {}), "rerank_score": round(score, 4)}
+            best.append(document)
+        return best
+
+    def stats(self):
+        return {
+            "model": RERANKER_MODEL_NAME,
+            "pairs": self.pairs,
+            "cached_pairs": self.cached_pairs,
+            "cache_entries": len(self._scores),
+            "scoring_seconds": round(self.seconds, 3),
+        }
+
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker():
+    """
+    Returns the process-wide reranker.
+    """
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
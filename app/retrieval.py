@@ -0,0 +1,218 @@
+import os
+import time
+from typing import Any
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.lexical_index import get_lexical_index
+from app.query_cache import get_query_cache
+from app.reranker import get_reranker
+from app.vectorizer import (
+    MULTILINGUAL_MODEL_NAME,
+    ENGLISH_MODEL_NAME,
+    EMBEDDING_BACKEND,
+    vectorize_text,
+    vectorize_sources,
+    pooling_for,
+)
+
+# Constant of reciprocal rank fusion; larger values flatten the influence of top ranks
+RRF_K = 60
+# Candidates taken from each ranking before fusion, relative to the number of results
+CANDIDATE_FACTOR = int(os.environ.get("HYBRID_CANDIDATE_FACTOR", 4))
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K, limit=None):
+    """
+    Fuses several ranked id lists into one. Each id scores sum(1 / (k + rank)) over the
+    rankings it appears in. Returns ids, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    return fused[:limit] if limit else fused
+
+
+def query_model_key(collection_name):
+    """
+    Identifies the embedding model, pooling and backend used for queries against a collection.
+    """
+    if collection_name == "sources":
+        return f"{ENGLISH_MODEL_NAME}:{EMBEDDING_BACKEND}"
+    return f"{MULTILINGUAL_MODEL_NAME}:{pooling_for(collection_name)}:{EMBEDDING_BACKEND}"
+
+
+def _embed_cached(model_key, query, embed):
+    # Repeated queries are served from the query cache
+    cache = get_query_cache()
+    key = (model_key, query)
+    if cache:
+        embedding = cache.embeddings.get(key)
+        if embedding is not None:
+            return embedding
+
+    start = time.perf_counter()
+    embedding = embed(query)
+    if cache:
+        cache.embeddings.put(key, embedding, time.perf_counter() - start)
+    return embedding
+
+
+def embed_query(collection_name, query):
+    """
+    Embeds a query with the model the collection was embedded with. Repeated queries
+    are served from the query cache.
+    """
+    if collection_name == "sources":
+        return _embed_cached(query_model_key(collection_name), query, vectorize_sources)
+    return _embed_cached(
+        query_model_key(collection_name), query,
+        lambda text: vectorize_text(text, pooling=pooling_for(collection_name)),
+    )
+
+
+# Questions are compared with each other in the sentence model's space for every
+# collection; RoBERTa-XLM CLS vectors have no meaningful cosine neighbourhoods
+QUESTION_MODEL_KEY = f"{ENGLISH_MODEL_NAME}:{EMBEDDING_BACKEND}"
+
+
+def embed_question(query):
+    """
+    Embeds a question with all-mpnet-v2 for comparing it with other questions. For the
+    sources collection this is also the retrieval embedding, so it is computed once.
+    """
+    return _embed_cached(QUESTION_MODEL_KEY, query, vectorize_sources)
+
+
+# Default of the lexical_ids arguments: lexical_only has not been consulted yet
+_UNCHECKED = object()
+
+
+def lexical_only(collection_name, query):
+    """
+    Returns ids answered by the lexical index alone, or None if dense retrieval is needed.
+
+    Only exact document ids (e.g. chapter ids) are served without embedding the query;
+    all other queries, single terms included, fuse BM25 with vector search.
+    """
+    query = query.strip()
+    if get_lexical_index().contains(collection_name, query):
+        return [query]
+    return None
+
+
+def rank_ids(collection, collection_name, query, n_results=5, timings=None, lexical_ids=_UNCHECKED):
+    """
+    Ranks document ids for a query with BM25 and vector similarity, fused with
+    reciprocal rank fusion. Returns (ids, mode) where mode is 'lexical' if the query
+    was answered without an embedding forward pass, otherwise 'hybrid'.
+    If a `timings` dict is given, the seconds spent embedding the query and searching
+    are added to its 'embed' and 'search' entries. Callers that already called
+    lexical_only pass its result as `lexical_ids`, so it is not looked up again.
+    """
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+    ids = lexical_only(collection_name, query) if lexical_ids is _UNCHECKED else lexical_ids
+    if ids is not None:
+        timings["search"] = timings.get("search", 0.0) + time.perf_counter() - start
+        return ids[:n_results], "lexical"
+
+    candidates = n_results * CANDIDATE_FACTOR
+    lexical_ids = [doc_id for doc_id, _ in get_lexical_index().search(collection_name, query, candidates)]
+    searched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    query_embedding = embed_query(collection_name, query)
+    timings["embed"] = timings.get("embed", 0.0) + time.perf_counter() - start
+
+    start = time.perf_counter()
+    dense = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=candidates,
+        include=[],
+    )
+    dense_ids = dense["ids"][0] if dense["ids"] else []
+    timings["search"] = timings.get("search", 0.0) + searched + time.perf_counter() - start
+    return reciprocal_rank_fusion([lexical_ids, dense_ids], limit=n_results), "hybrid"
+
+
+def fetch_in_order(collection, ids):
+    """
+    Returns (id, document, metadata) triples for ids, in the given order.
+    """
+    if not ids:
+        return []
+    results = collection.get(ids=ids, include=["documents", "metadatas"])
+    by_id = {doc_id: (doc_id, document, metadata) for doc_id, document, metadata in
+             zip(results["ids"], results["documents"], results["metadatas"])}
+    # collection.get does not preserve the order of ids
+    return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+
+def hybrid_search(collection, collection_name, query, n_results=5):
+    """
+    Searches a collection with BM25 and vector similarity. Results are cached per
+    collection version, so any write to the collection invalidates them.
+
+    Returns:
+        tuple: (list of (document, metadata) pairs, dict with 'mode' and 'seconds').
+    """
+    from app.chroma import get_collection_version
+
+    start = time.perf_counter()
+    cache = get_query_cache()
+    key = (collection_name, query_model_key(collection_name), query, n_results,
+           get_collection_version(collection_name))
+    if cache:
+        cached = cache.results.get(key)
+        if cached is not None:
+            zipped, mode = cached
+            return zipped, {"mode": f"{mode} (cached)", "seconds": time.perf_counter() - start}
+
+    ids, mode = rank_ids(collection, collection_name, query, n_results)
+    zipped = [(document, metadata) for _, document, metadata in fetch_in_order(collection, ids)]
+    seconds = time.perf_counter() - start
+    if cache:
+        cache.results.put(key, (zipped, mode), seconds)
+    return zipped, {"mode": mode, "seconds": seconds}
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    LangChain retriever fusing BM25 results from the lexical index with the vector
+    store's similarity search.
+
+    With `rerank`, `candidates` documents are retrieved and a cross-encoder keeps the
+    best k, so the prompt gets few but relevant documents.
+    """
+
+    vectorstore: Any
+    collection_name: str
+    k: int = 5
+    rerank: bool = False
+    candidates: int = 0
+
+    def retrieve(self, query, timings=None, lexical_ids=_UNCHECKED):
+        """
+        Returns the documents for a query, adding 'embed', 'search' and 'rerank' seconds to `timings`.
+        `lexical_ids` is the result of lexical_only if the caller already has it.
+        """
+        timings = timings if timings is not None else {}
+        collection = self.vectorstore._collection
+        n_results = max(self.k, self.candidates) if self.rerank else self.k
+        ids, _ = rank_ids(collection, self.collection_name, query, n_results, timings, lexical_ids)
+        start = time.perf_counter()
+        documents = [
+            Document(page_content=document or "", metadata=metadata or {})
+            for _, document, metadata in fetch_in_order(collection, ids)
+        ]
+        timings["search"] = timings.get("search", 0.0) + time.perf_counter() - start
+        if self.rerank and len(documents) > self.k:
+            start = time.perf_counter()
+            documents = get_reranker().rerank(query, documents, self.k)
+            timings["rerank"] = timings.get("rerank", 0.0) + time.perf_counter() - start
+        return documents
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.retrieve(query)
@@ -1,15 +1,34 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 import uuid
-from app.models import db, User, Role
-from app.chroma import get_collection, get_chroma_retriever
-from app.vectorizer import vectorize_text, vectorize_sources
-from app.langchain import get_rag_chain
+from app.models import db, User, Role, IngestJob, LiteratureDocument
+from app.chroma import (
+    get_collection,
+    get_chroma_retriever,
+    document_exists,
+    paginate_collection,
+    mark_collection_changed,
+    truncate_collection,
+    TRUNCATE_MODES,
+)
+from app.vectorizer import vectorize_text, pooling_for
+from app.ingest import import_chapters, format_import_stats, ChapterImportError
+from app.jobs import enqueue_literature_job, resume_job
+from app.embedding_cache import get_embedding_cache
+from app.lexical_index import get_lexical_index
+from app.document_store import get_document_store
+from app.retrieval import hybrid_search
+from app.query_cache import get_query_cache
+from app.object_cache import get_object_cache
+from app.answer_cache import get_answer_cache
+from app.reranker import get_reranker
+from app.model_registry import registry
+from app import embedding_server
+from app.langchain import stream_stats
+from app.rag import answer_question, stream_question
+from app.llm_gateway import get_llm_gateway, LLMOverloaded
 import os
 from werkzeug.utils import secure_filename
-from PyPDF2 import PdfReader
-from app.utils.pdf_utils import extract_text_from_pdf_with_pages
-from app.utils.text_utils import chunk_text_with_page_numbers
 import json
 import traceback
 
@@ -19,6 +38,44 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 bp = Blueprint('routes', __name__)
 
+# Rows per page of the manage pages
+PAGE_SIZE = 50
+EMPTY_PAGE = {"ids": [], "documents": [], "metadatas": [], "page": 1, "pages": 1, "total": 0, "offset": 0}
+# Metadata fields shown in collapsed listings
+LISTING_FIELDS = {
+    "sources": ["chapter_id", "chapter_url", "latin_heading", "english_heading"],
+}
+
+
+def project_metadata(metadata, collection_name):
+    """
+    Keeps only the metadata fields a collapsed listing renders.
+    """
+    fields = LISTING_FIELDS.get(collection_name)
+    if not fields or not metadata:
+        return metadata or {}
+    return {field: metadata[field] for field in fields if field in metadata}
+
+
+# Document store fields rendered by the templates, collapsed and expanded
+RENDERED_FIELDS = {
+    "sources": (["latin_heading"], ["latin_heading", "latin_content"]),
+}
+
+
+def hydrate_documents(collection_name, documents, expand=True):
+    """
+    Adds the rendered document store fields to the metadata of LangChain documents.
+    """
+    fields = RENDERED_FIELDS.get(collection_name, ([], []))[expand]
+    if not fields or not documents:
+        return documents
+    ids = [doc.metadata.get("chapter_id") or doc.metadata.get("id") for doc in documents]
+    metadatas = get_document_store().hydrate(collection_name, ids, [doc.metadata for doc in documents], fields)
+    for doc, metadata in zip(documents, metadatas):
+        doc.metadata = metadata
+    return documents
+
 # Home page
 @bp.route('/')
 def index():
@@ -104,6 +161,108 @@ def admin():
     return render_template('admin.html')
 
 
+# Cache and LLM counters rendered as one page (admin only); the JSON routes below serve the same dicts
+@bp.route('/admin/stats')
+@login_required
+def admin_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    embedding_cache = get_embedding_cache()
+    query_cache = get_query_cache()
+    answer_cache = get_answer_cache()
+    sections = {
+        "Query cache": query_cache.stats() if query_cache else {"enabled": False},
+        "Embedding cache": embedding_cache.stats() if embedding_cache else {"enabled": False},
+        "Answer cache": answer_cache.stats() if answer_cache else {"enabled": False},
+        "LLM": {**stream_stats(), "gateway": get_llm_gateway().stats()},
+        "Reranker": get_reranker().stats(),
+        "Object cache": get_object_cache().stats(),
+        "Models": registry.stats(),
+    }
+    return render_template('admin_stats.html', sections=sections)
+
+
+# Embedding cache counters (admin only)
+@bp.route('/admin/stats/embedding_cache')
+@login_required
+def embedding_cache_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    cache = get_embedding_cache()
+    return jsonify(cache.stats() if cache else {"enabled": False})
+
+
+# Query embedding and search result cache counters (admin only)
+@bp.route('/admin/stats/query_cache')
+@login_required
+def query_cache_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    cache = get_query_cache()
+    return jsonify(cache.stats() if cache else {"enabled": False})
+
+
+# Time to first token, tokens per second and LLM queue metrics (admin only)
+@bp.route('/admin/stats/llm')
+@login_required
+def llm_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    # Queue wait, generation time and rejections of the LLM gateway next to the stream timings
+    return jsonify({**stream_stats(), "gateway": get_llm_gateway().stats()})
+
+
+# Hit ratio and saved LLM time of the semantic answer cache (admin only)
+@bp.route('/admin/stats/answer_cache')
+@login_required
+def answer_cache_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    cache = get_answer_cache()
+    return jsonify(cache.stats() if cache else {"enabled": False})
+
+
+# Cross-encoder pairs scored and served from the score cache (admin only)
+@bp.route('/admin/stats/reranker')
+@login_required
+def reranker_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    return jsonify(get_reranker().stats())
+
+
+# Build times and occupancy of the object cache (admin only)
+@bp.route('/admin/stats/object_cache')
+@login_required
+def object_cache_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    return jsonify(get_object_cache().stats())
+
+
+# Model load times and memory (admin only)
+@bp.route('/admin/stats/models')
+@login_required
+def model_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    return jsonify(registry.stats())
+
+
+# Embedding server queue and latency (admin only)
+@bp.route('/admin/stats/embedding_server')
+@login_required
+def embedding_server_stats():
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+    if not embedding_server.EMBEDDING_SERVER_SOCKET:
+        return jsonify({"enabled": False})
+    try:
+        return jsonify(embedding_server.get_client().stats())
+    except (embedding_server.EmbeddingServerUnavailable, embedding_server.EmbeddingServerTimeout) as e:
+        return jsonify({"enabled": True, "error": str(e)}), 503
+
+
 # Assign roles (admin only)
 @bp.route('/assign_role', methods=['GET', 'POST'])
 @login_required
@@ -211,18 +370,21 @@ def manage_collection(collection_name):
         content = request.form.get('content')
 
         if doc_id and content:
-            # Check if the document already exists
-            existing = collection.get(include=['documents', 'metadatas'])
-            if any(meta.get('id') == doc_id for meta in existing['metadatas']):
+            overwrite = request.form.get('overwrite') == 'on'
+            # Check if the document already exists by primary key
+            if not overwrite and document_exists(collection, doc_id):
                 flash(f"Document with ID '{doc_id}' already exists in {collection_name}.", "danger")
             else:
-                # Add document to the collection
-                collection.add(
+                # Add or replace the document in the collection
+                collection.upsert(
                     ids=[doc_id],
                     documents=[content],
                     metadatas=[{"id": doc_id, "added_by": current_user.username}]
                 )
-                flash(f"Document '{doc_id}' added successfully to {collection_name}.", "success")
+                get_lexical_index().add_documents(collection_name, [doc_id], [content])
+                get_document_store().delete(collection_name, [doc_id])
+                mark_collection_changed(collection_name)
+                flash(f"Document '{doc_id}' saved successfully to {collection_name}.", "success")
         else:
             flash("Document ID and content are required.", "danger")
 
@@ -232,22 +394,49 @@ def manage_collection(collection_name):
         # Ensure the document exists before attempting to delete
         try:
             collection.delete(ids=[doc_id])
+            get_lexical_index().delete_documents(collection_name, [doc_id])
+            get_document_store().delete(collection_name, [doc_id])
+            mark_collection_changed(collection_name)
             flash(f"Document '{doc_id}' deleted successfully from {collection_name}.", "success")
         except Exception as e:
             flash(f"Error deleting document '{doc_id}': {str(e)}", "danger")
         return redirect(url_for('routes.manage_collection', collection_name=collection_name))
 
-    # Fetch all documents from the collection
+    # Fetch one page of the collection; documents only when the listing is expanded
+    page = request.args.get('page', 1, type=int)
+    expand = request.args.get('expand') == '1'
+    search = request.args.get('q', '').strip()
     try:
-        documents = collection.get(include=['documents', 'metadatas'])
+        documents = paginate_collection(
+            collection, page, PAGE_SIZE,
+            include=['documents', 'metadatas'] if expand else ['metadatas'],
+            search=search or None,
+        )
+        # Texts kept outside Chroma are loaded only for the fields the page renders
+        fields = RENDERED_FIELDS.get(collection_name, ([], []))[expand]
+        if fields:
+            documents['metadatas'] = get_document_store().hydrate(
+                collection_name, documents['ids'], documents['metadatas'], fields
+            )
+        # The global metadata of the imported files, stored once per file instead of per chapter
+        block_ids = dict.fromkeys(
+            meta['metadata_block'] for meta in documents['metadatas'] if meta.get('metadata_block')
+        )
+        metadata_blocks = [get_document_store().get_metadata_block(block_id) for block_id in block_ids]
+        if not expand:
+            documents['metadatas'] = [project_metadata(meta, collection_name) for meta in documents['metadatas']]
     except Exception as e:
         flash(f"Error fetching documents: {str(e)}", "danger")
-        documents = {"documents": [], "metadatas": []}
+        documents = EMPTY_PAGE
+        metadata_blocks = []
 
     return render_template(
         'manage_collection.html', 
         documents=documents, 
         collection_name=collection_name,
+        metadata_blocks=metadata_blocks,
+        expand=expand,
+        search=search,
         zip=zip
     )
 
@@ -270,39 +459,51 @@ def manage_notes():
         if not doc_id:
             doc_id = f"note_{uuid.uuid4().hex[:8]}"  # Generates a unique ID like 'note_ab12cd34'
 
-        if content:
+        if not content:
+            flash("Content cannot be empty.", "danger")
+        elif document_exists(collection, doc_id):
+            # Checked by primary key before embedding, as in manage_collection
+            flash(f"Note with ID '{doc_id}' already exists.", "danger")
+        else:
             # Generate embedding using RoBERTa-XLM
-            embedding = vectorize_text(content)
+            embedding = vectorize_text(content, pooling=pooling_for("notes"))
 
-            # Add the document to the collection
-            collection.add(
+            # Upsert, like the lexical index, so both hold the same text for an id
+            collection.upsert(
                 ids=[doc_id],
                 documents=[content],
                 metadatas=[{"id": doc_id, "added_by": current_user.username}],
                 embeddings=[embedding]
             )
+            get_lexical_index().add_documents("notes", [doc_id], [content])
+            mark_collection_changed("notes")
             flash(f"Note '{doc_id}' added successfully.", "success")
-        else:
-            flash("Content cannot be empty.", "danger")
 
     # Handle delete request
     if request.args.get('delete'):
         doc_id = request.args.get('delete')
         try:
             collection.delete(ids=[doc_id])
+            get_lexical_index().delete_documents("notes", [doc_id])
+            mark_collection_changed("notes")
             flash(f"Note '{doc_id}' deleted successfully.", "success")
         except Exception as e:
             flash(f"Error deleting note '{doc_id}': {str(e)}", "danger")
         return redirect(url_for('routes.manage_notes'))
 
-    # Fetch all notes
+    # Fetch one page of notes; contents only when the listing is expanded
+    page = request.args.get('page', 1, type=int)
+    expand = request.args.get('expand') == '1'
     try:
-        documents = collection.get(include=['documents', 'metadatas'])
+        documents = paginate_collection(
+            collection, page, PAGE_SIZE,
+            include=['documents', 'metadatas'] if expand else ['metadatas'],
+        )
     except Exception as e:
         flash(f"Error fetching notes: {str(e)}", "danger")
-        documents = {"documents": [], "metadatas": []}
+        documents = EMPTY_PAGE
 
-    return render_template('manage_notes.html', documents=documents)
+    return render_template('manage_notes.html', documents=documents, expand=expand)
 
 
 @bp.route('/search/<collection_name>', methods=['GET', 'POST'])
@@ -317,7 +518,6 @@ def search_collection(collection_name):
     if collection_name not in valid_collections:
         return "Invalid Collection", 404
 
-    results = None
     zipped_results = []
     query = None
 
@@ -327,24 +527,11 @@ def search_collection(collection_name):
             flash("Search query cannot be empty.", "danger")
             return redirect(url_for('routes.search_collection', collection_name=collection_name))
 
-        # Vectorize the query
-        query_embedding = vectorize_text(query)
-        print(f"Query Embedding: {query_embedding}")  # Debugging
-
-        # Perform similarity search
+        # Rank with the BM25 index and vector similarity; exact ids skip the embedding
         collection = get_collection(collection_name)
         try:
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=5,
-                include=['documents', 'metadatas']
-            )
-            print(f"Search Results: {results}")  # Debugging
-
-            # Flatten documents and metadata
-            documents = results['documents'][0] if results['documents'] else []
-            metadatas = results['metadatas'][0] if results['metadatas'] else []
-            zipped_results = list(zip(documents, metadatas))  # Combine documents and metadatas
+            zipped_results, search_stats = hybrid_search(collection, collection_name, query, n_results=5)
+            print(f"Search ({search_stats['mode']}) took {search_stats['seconds'] * 1000:.2f} ms")
         except Exception as e:
             flash(f"Error during search: {str(e)}", "danger")
             print(f"Search Error: {str(e)}")  # Debugging
@@ -387,33 +574,16 @@ def search_with_langchain(collection_name):
         try:
             # Get ChromaDB retriever
             retriever = get_chroma_retriever(collection_name, model_name="sentence-transformers/all-mpnet-base-v2", k=k)
-            rag_chain = get_rag_chain(retriever)  # Uses cached chain if retriever hasn't changed
-            #print(rag_chain.input_keys)  # Outputs the expected input keys for the chain
-
-            # Retrieve documents
-            documents = retriever.get_relevant_documents(query)
-            #print(documents)
-
-            """
-            # Format context with document IDs for the RAG chain
-            formatted_context = "\n".join([
-                f"Document ID: {doc.metadata.get('chapter_id', 'unknown')}, Content: {doc.page_content}"
-                for doc in documents
-            ])
-
-            print(formatted_context) # This is printed
-            """
-            # Pass context and query to the RAG chain
-            result = rag_chain({"query": query})
-            
-            #result = rag_chain({"context": formatted_context, "question": query})
-            #print(result) # this is not printed
-            answer = result["result"]
 
-            # Set retrieved documents for rendering
-            retrieved_documents = documents
-            #print(retrieved_documents)
+            # Retrieve once; the same documents go into the prompt and the rendered result
+            result = answer_question(retriever, query, user=current_user.username)
+            answer = result["result"]
+            retrieved_documents = hydrate_documents(collection_name, result["source_documents"])
+            if result["cached"]:
+                flash("Answer reused from a similar earlier question.", "info")
 
+        except LLMOverloaded as e:
+            flash(f"The language model is busy, please try again later. {e}", "warning")
         except Exception as e:
             print(e)
             traceback.print_exc()
@@ -429,6 +599,61 @@ def search_with_langchain(collection_name):
     )
 
 
+def sse_event(event, data):
+    """
+    Formats one Server-Sent Event with a JSON payload.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@bp.route('/search_with_langchain/<collection_name>/stream')
+@login_required
+def stream_with_langchain(collection_name):
+    # Check user permissions
+    if not current_user.has_role('Admin') and not current_user.has_role('Editor'):
+        return "Access Denied", 403
+
+    # Validate collection name
+    valid_collections = ["sources", "literature", "notes"]
+    if collection_name not in valid_collections:
+        return "Invalid Collection", 404
+
+    query = request.args.get('query')
+    k = request.args.get('k', 5, type=int)
+    if not query:
+        return "Search query cannot be empty.", 400
+
+    # Sends the retrieved documents first, then the answer token by token
+    def generate():
+        try:
+            retriever = get_chroma_retriever(collection_name, model_name="sentence-transformers/all-mpnet-base-v2", k=k)
+            # Closing this generator on disconnect also cancels the LLM request, queued or running
+            for kind, data in stream_question(retriever, query, user=current_user.username):
+                if kind == "documents":
+                    # Hydrated like the POST results, so both paths render the same fields
+                    yield sse_event("documents", [
+                        {"page_content": doc.page_content, "metadata": doc.metadata}
+                        for doc in hydrate_documents(collection_name, data)
+                    ])
+                elif kind == "queued":
+                    yield sse_event("queued", {"position": data})
+                elif kind == "token":
+                    yield sse_event("token", {"text": data})
+                else:
+                    yield sse_event("done", data)
+        except LLMOverloaded as e:
+            yield sse_event("error", {"message": f"The language model is busy, please try again later. {e}"})
+        except Exception as e:
+            traceback.print_exc()
+            yield sse_event("error", {"message": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @bp.route('/literature/delete_all', methods=['POST'])
 @login_required
 def delete_all_literature():
@@ -436,28 +661,16 @@ def delete_all_literature():
     if not current_user.has_role('Admin'):
         return "Access Denied", 403
 
-    print("Deleting collection")
-
     try:
-        # Get the Literature collection
-        collection = get_collection("literature")
-
-        # Fetch all metadata to extract IDs
-        all_documents = collection.get(include=["metadatas"])
-        print(f"All metadatas: {all_documents}")
-
-        # Extract all IDs from metadata
-        all_ids = [meta.get("id") for meta in all_documents.get("metadatas", [])]
-        print(f"All document IDs: {all_ids}")
-
-        # Delete all documents if any IDs are present
-        if all_ids:
-            collection.delete(ids=all_ids)
-            flash(f"Deleted all {len(all_ids)} documents from the literature collection.", "success")
-            print(f"Successfully deleted {len(all_ids)} documents.")
+        # Deletes in bounded batches; only ids are read from Chroma
+        for progress in truncate_collection("literature"):
+            print(f"Deleted {progress['deleted']} of {progress['total']} literature chunks")
+        LiteratureDocument.query.delete()
+        db.session.commit()
+        if progress["deleted"]:
+            flash(f"Deleted all {progress['deleted']} chunks from the literature collection.", "success")
         else:
             flash("No documents found to delete.", "info")
-
     except Exception as e:
         flash(f"Error deleting all documents: {str(e)}", "danger")
         print(f"Error deleting documents: {str(e)}")
@@ -465,6 +678,40 @@ def delete_all_literature():
     return redirect(url_for('routes.manage_literature'))
 
 
+@bp.route('/admin/collections/<collection_name>/truncate', methods=['POST'])
+@login_required
+def truncate_collection_route(collection_name):
+    # Restrict access to Admins only
+    if not current_user.has_role('Admin'):
+        return "Access Denied", 403
+
+    valid_collections = ["sources", "literature", "notes"]
+    if collection_name not in valid_collections:
+        return "Invalid Collection", 404
+    mode = request.form.get('mode', 'batches')
+    if mode not in TRUNCATE_MODES:
+        return f"Invalid mode '{mode}'", 400
+    batch_size = request.form.get('batch_size', 1000, type=int)
+    if batch_size < 1:
+        return f"Invalid batch size {batch_size}, expected at least 1", 400
+
+    # Progress is streamed as plain text lines while the deletion runs
+    def generate():
+        try:
+            for progress in truncate_collection(collection_name, mode=mode, batch_size=batch_size):
+                if progress["done"]:
+                    if collection_name == "literature":
+                        LiteratureDocument.query.delete()
+                        db.session.commit()
+                    yield f"Done: {progress['deleted']} documents deleted from '{collection_name}'.\n"
+                else:
+                    yield f"Deleted {progress['deleted']} of {progress['total']} documents ({mode})\n"
+        except Exception as e:
+            yield f"Error truncating '{collection_name}': {str(e)}\n"
+
+    return Response(stream_with_context(generate()), mimetype='text/plain')
+
+
 
 
 def allowed_file(filename):
@@ -497,48 +744,13 @@ def manage_literature():
             return redirect(url_for('routes.manage_literature'))
 
         filename = secure_filename(file.filename)
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        file_path = os.path.join(UPLOAD_FOLDER, f"{uuid.uuid4().hex[:8]}_{filename}")
         os.makedirs(UPLOAD_FOLDER, exist_ok=True)
         file.save(file_path)
 
-        try:
-            document_id = f"doc_{uuid.uuid4().hex[:8]}"
-            page_texts = extract_text_from_pdf_with_pages(file_path)
-            print(page_texts)
-
-            # Chunk the text and create embeddings
-            chunks_with_pages = chunk_text_with_page_numbers(page_texts, max_length=300)
-            print("Starting embedding")
-            for i, chunk in enumerate(chunks_with_pages):
-                chunk_id = f"{document_id}_chunk_{i + 1}"
-                text = chunk[0]
-                page_number = chunk[1]
-                embedding = vectorize_text(text)
-                print(f"Add {chunk_id} to collection")
-
-                collection.add(
-                    ids=[chunk_id],
-                    documents=[text],
-                    metadatas=[
-                        {
-                            "chunk_id": chunk_id,
-                            "document_id": document_id,
-                            "author": author,
-                            "title": title,
-                            "year": year,
-                            "page_number": page_number,
-                            "added_by": current_user.username,
-                        }
-                    ],
-                    embeddings=[embedding],
-                )
-
-            flash(f"PDF '{title}' processed and added to the collection.", "success")
-        except Exception as e:
-            flash(f"Error processing PDF: {str(e)}", "danger")
-        finally:
-            # Clean up the uploaded file
-            os.remove(file_path)
+        # Extraction, chunking and embedding run in the background workers (see run_worker.py)
+        job = enqueue_literature_job(file_path, author, title, year, current_user.username)
+        flash(f"PDF '{title}' queued for processing as job {job.id}.", "success")
 
         return redirect(url_for('routes.manage_literature'))
 
@@ -546,39 +758,61 @@ def manage_literature():
     if request.args.get('delete'):
         document_id = request.args.get('delete')
         try:
-            all_chunks = collection.get(include=["metadatas"], where={"document_id": document_id})
-            chunk_ids = [meta["chunk_id"] for meta in all_chunks["metadatas"]]
-            collection.delete(ids=chunk_ids)
+            # Chroma resolves the filter itself, so the chunks are not read back first
+            collection.delete(where={"document_id": document_id})
+            document = LiteratureDocument.query.get(document_id)
+            if document:
+                get_lexical_index().delete_documents("literature", document.chunk_ids())
+                db.session.delete(document)
+                db.session.commit()
+            mark_collection_changed("literature")
             flash(f"Document '{document_id}' deleted successfully.", "success")
         except Exception as e:
             flash(f"Error deleting document '{document_id}': {str(e)}", "danger")
         return redirect(url_for('routes.manage_literature'))
 
-    # Fetch all documents
-    try:
-        documents = collection.get(include=["metadatas"])
-        from collections import defaultdict
+    # List PDFs from the catalog, one page at a time
+    page = request.args.get('page', 1, type=int)
+    total = LiteratureDocument.query.count()
+    pages = max(1, -(-total // PAGE_SIZE))
+    page = min(max(1, page), pages)
+    pagination = {"page": page, "pages": pages, "total": total, "offset": (page - 1) * PAGE_SIZE}
+    documents = (
+        LiteratureDocument.query.order_by(LiteratureDocument.created_at.desc())
+        .offset(pagination["offset"]).limit(PAGE_SIZE).all()
+    )
 
-        grouped_documents = defaultdict(
-            lambda: {"chunk_count": 0, "author": "", "title": "", "year": "", "added_by": ""}
-        )
-        for metadata in documents["metadatas"]:
-            doc_id = metadata["document_id"]
-            grouped_documents[doc_id].update(
-                {
-                    "author": metadata["author"],
-                    "title": metadata["title"],
-                    "year": metadata["year"],
-                    "added_by": metadata["added_by"],
-                }
-            )
-            grouped_documents[doc_id]["chunk_count"] += 1
+    jobs = IngestJob.query.order_by(IngestJob.created_at.desc()).limit(10).all()
 
-    except Exception as e:
-        flash(f"Error fetching literature: {str(e)}", "danger")
-        grouped_documents = {}
+    return render_template("manage_literature.html", documents=documents, jobs=jobs, pagination=pagination)
 
-    return render_template("manage_literature.html", documents=grouped_documents)
+
+@bp.route('/jobs/<job_id>')
+@login_required
+def job_status(job_id):
+    # Restrict access to Admins and Editors
+    if not current_user.has_role('Admin') and not current_user.has_role('Editor'):
+        return "Access Denied", 403
+
+    job = IngestJob.query.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.progress())
+
+
+@bp.route('/jobs/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_ingest_job(job_id):
+    # Restrict access to Admins and Editors
+    if not current_user.has_role('Admin') and not current_user.has_role('Editor'):
+        return "Access Denied", 403
+
+    job = resume_job(job_id)
+    if job:
+        flash(f"Job {job.id} resumed after {job.chunks_done} committed chunks.", "success")
+    else:
+        flash(f"Job {job_id} cannot be resumed.", "danger")
+    return redirect(url_for('routes.manage_literature'))
 
 
 
@@ -609,73 +843,21 @@ def upload_json(collection_name):
             return redirect(url_for('routes.manage_collection', collection_name=collection_name))
 
         try:
-            print("Starting")
-            print(file)
-            # Load the JSON data
-            data = json.load(file)
-            print(data)
-
-            # Extract metadata and validate structure
-            metadata = data.get("metadata", {})
-            chapters = data.get("chapters", [])
-            print(len(metadata))
-            print(len(chapters))
-
-            if not metadata or not isinstance(chapters, list):
-                flash("Invalid JSON structure. Missing metadata or chapters.", "danger")
-                return redirect(url_for('routes.manage_collection', collection_name=collection_name))
-
             # Get ChromaDB collection
             collection = get_collection(collection_name)
-            print(collection)
-
-            # Process each chapter
-            for chapter in chapters:
-                chapter_id = chapter.get("id")
-                chapter_url = chapter.get("url", "")
-                english_content = chapter.get("english", {}).get("content", "")
-
-                if chapter_id and english_content:
-                    # Vectorize only the English content
-                    embedding = vectorize_sources(english_content)
-
-                    # Combine global metadata with chapter-specific metadata
-                    chapter_metadata = {
-                        **metadata,  # Include global metadata
-                        "chapter_id": chapter_id,
-                        "chapter_url": chapter_url,
-                        "latin_content": chapter.get("latin", {}).get("content", ""),
-                        "german_content": chapter.get("german", {}).get("content", ""),
-                        "english_heading": chapter.get("english", {}).get("heading", ""),
-                        "latin_heading": chapter.get("latin", {}).get("heading", "")
-
-                    }
-
-                    try:
-                        # Add chapter to collection
-                        collection.add(
-                            ids=[chapter_id],
-                            documents=[english_content],  # Only English content as document
-                            metadatas=[chapter_metadata],
-                            embeddings=[embedding]
-                        )
-                        print(f"Successfully added chapter {chapter_id} to the collection.")
-                    except Exception as e:
-                        print(f"Error adding chapter {chapter_id} to collection: {e}")
-
-
-                    print(f"Adding to collection: {collection_name}")
-                    print(f"Chapter ID: {chapter_id}")
-                    print(f"Document: {english_content}")
-                    print(f"Metadata: {chapter_metadata}")
-                    print(f"Embedding: {embedding}")
 
+            # Load and validate the whole file, then encode and write chapters in batches
+            stats = import_chapters(collection, file)
+            print(f"Import into {collection_name}: {format_import_stats(stats)}")
 
-                else:
-                    flash(f"Skipping chapter with missing 'id' or 'english.content': {chapter}", "warning")
+            if stats["skipped"]:
+                skipped = ", ".join(str(item) for item in stats["skipped"][:10])
+                flash(f"Skipped {len(stats['skipped'])} chapters with missing 'id' or 'english.content': {skipped}", "warning")
 
-            flash("JSON data successfully imported into the collection.", "success")
+            flash(f"JSON data successfully imported into the collection: {format_import_stats(stats)}.", "success")
 
+        except ChapterImportError as e:
+            flash(str(e), "danger")
         except Exception as e:
             flash(f"Error processing JSON file: {str(e)}", "danger")
 
@@ -1,12 +1,61 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from PyPDF2 import PdfReader
 
-def extract_text_from_pdf_with_pages(file_path):
+# PDFs with at least this many pages are extracted by a process pool
+PARALLEL_PAGE_THRESHOLD = int(os.environ.get("PDF_PARALLEL_PAGE_THRESHOLD", 100))
+# Worker processes for parallel extraction (0 uses the number of CPUs)
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", 0))
+# Pages extracted per task of the process pool
+PAGE_BLOCK_SIZE = 16
+
+
+def _clean_page_text(text):
+    return (text or "").replace("-\n", "")
+
+
+def count_pdf_pages(file_path):
+    """
+    Returns the number of pages of a PDF file.
+    """
+    return len(PdfReader(file_path).pages)
+
+
+def _extract_page_block(file_path, start, end):
     """
-    Extracts text from a PDF file, returning a dictionary of page numbers and text.
+    Extracts pages [start, end) of a PDF file. Runs in a worker process.
     """
-    from PyPDF2 import PdfReader
     reader = PdfReader(file_path)
-    page_texts = {}
-    for page_number, page in enumerate(reader.pages, start=1):
-        page_texts[page_number] = page.extract_text().replace("-\n", "")
-    return page_texts
\ No newline at end of file
+    return [(page_number + 1, _clean_page_text(reader.pages[page_number].extract_text()))
+            for page_number in range(start, end)]
+
+
+def extract_text_from_pdf_with_pages(file_path, workers=None):
+    """
+    Extracts text from a PDF file, yielding (page number, text) tuples in page order.
+
+    Pages are produced one at a time, so callers can chunk and embed the first pages
+    while the rest of the PDF is still being parsed. Large PDFs are extracted by a
+    process pool in blocks of pages; at most two blocks per worker are in flight, which
+    keeps memory bounded when the consumer is slower than the extraction.
+    """
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    workers = workers or PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+    if workers <= 1 or page_count < PARALLEL_PAGE_THRESHOLD:
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield page_number, _clean_page_text(page.extract_text())
+        return
+
+    blocks = [(start, min(start + PAGE_BLOCK_SIZE, page_count)) for start in range(0, page_count, PAGE_BLOCK_SIZE)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        next_block = 0
+        while next_block < len(blocks) or pending:
+            while next_block < len(blocks) and len(pending) < 2 * workers:
+                start, end = blocks[next_block]
+                pending.append(executor.submit(_extract_page_block, file_path, start, end))
+                next_block += 1
+            # Yield blocks in page order
+            yield from pending.pop(0).result()
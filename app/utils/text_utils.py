@@ -1,29 +1,106 @@
-def chunk_text_with_page_numbers(page_texts, max_length=500):
+import re
+
+
+# Sentence ends: terminal punctuation followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+")
+
+
+def split_sentences(text):
+    """
+    Splits a text into sentences on terminal punctuation, normalizing whitespace.
     """
-    Splits text from a dictionary of page numbers and texts into chunks of a specified maximum length.
-    
+    text = " ".join(text.split())
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text) if sentence]
+
+
+def _split_long_sentence(sentence, token_count, max_tokens):
+    """
+    Splits a sentence longer than max_tokens into word groups of roughly max_tokens tokens.
+    """
+    words = sentence.split()
+    parts = -(-token_count // max_tokens)  # Ceiling division
+    size = -(-len(words) // parts)
+    return [" ".join(words[i:i + size]) for i in range(0, len(words), size)]
+
+
+def chunk_pages(pages, count_tokens, max_tokens=256, overlap_tokens=32, min_tokens=48):
+    """
+    Splits page texts into chunks of at most `max_tokens` tokens along sentence boundaries.
+
+    Chunks may span pages and consecutive chunks share up to `overlap_tokens` tokens of
+    whole sentences. A chunk with fewer than `min_tokens` new tokens, such as the end of
+    the text or the few sentences before an over-long one, is merged into the previous
+    chunk instead of being emitted on its own, unless that would exceed `max_tokens`.
+
     Args:
-        page_texts (dict): A dictionary where keys are page numbers and values are page texts.
-        max_length (int): Maximum length of each chunk (in words).
+        pages (dict or iterable): Page numbers and texts, as a dict or (page number, text) tuples.
+        count_tokens (callable): Returns the token count of every text in a list.
+        max_tokens (int): Maximum length of each chunk in tokens of the embedding model.
+        overlap_tokens (int): Maximum number of tokens repeated from the previous chunk.
+        min_tokens (int): Minimum number of new tokens of a chunk.
 
-    Returns:
-        list: A list of tuples containing the chunk text and the page number it came from.
+    Yields:
+        dict: 'text', 'page_start', 'page_end' and 'tokens' of each chunk.
     """
-    print("Starting chunking process")
-    chunks_with_metadata = []
+    pages = pages.items() if isinstance(pages, dict) else pages
+
+    buffer = []       # (sentence, page number, tokens) of the current chunk
+    overlap_count = 0 # Leading buffer entries repeated from the previous chunk
+    new_tokens = 0    # Tokens in the buffer that are not overlap from the previous chunk
+    pending = None    # Last complete chunk, held back so a tiny next chunk can be merged into it
+
+    def build(sentences):
+        return {
+            "text": " ".join(sentence for sentence, _, _ in sentences),
+            "page_start": sentences[0][1],
+            "page_end": sentences[-1][1],
+            "tokens": sum(tokens for _, _, tokens in sentences),
+        }
+
+    def close(pending):
+        # Returns the chunk to emit (or None) and the new pending chunk
+        if pending is not None and new_tokens < min_tokens and pending["tokens"] + new_tokens <= max_tokens:
+            # Merge the new sentences of a tiny chunk into the previous chunk
+            return None, build([(pending["text"], pending["page_start"], pending["tokens"]),
+                                *buffer[overlap_count:]])
+        return pending, build(buffer)
+
+    for page_number, page_text in pages:
+        sentences = split_sentences(page_text)
+        if not sentences:
+            continue
+        for sentence, tokens in zip(sentences, count_tokens(sentences)):
+            pieces = [(sentence, tokens)]
+            if tokens > max_tokens:
+                parts = _split_long_sentence(sentence, tokens, max_tokens)
+                pieces = list(zip(parts, count_tokens(parts)))
+
+            for piece, piece_tokens in pieces:
+                buffer_tokens = sum(item[2] for item in buffer)
+                if new_tokens and buffer_tokens + piece_tokens > max_tokens:
+                    chunk, pending = close(pending)
+                    if chunk is not None:
+                        yield chunk
 
-    for page_number, page_text in page_texts.items():
-        words = page_text.split()
-        current_chunk = []
+                    # Start the next chunk with trailing sentences of this one
+                    overlap = []
+                    overlap_size = 0
+                    for item in reversed(buffer):
+                        if overlap_size + item[2] > overlap_tokens or overlap_size + item[2] + piece_tokens > max_tokens:
+                            break
+                        overlap.insert(0, item)
+                        overlap_size += item[2]
+                    buffer = overlap
+                    overlap_count = len(overlap)
+                    new_tokens = 0
 
-        for word in words:
-            current_chunk.append(word)
-            if len(current_chunk) >= max_length:
-                chunks_with_metadata.append((" ".join(current_chunk), page_number))
-                current_chunk = []
+                buffer.append((piece, page_number, piece_tokens))
+                new_tokens += piece_tokens
 
-        if current_chunk:
-            chunks_with_metadata.append((" ".join(current_chunk), page_number))
-    print("Finishing chunking process")
+    if new_tokens:
+        chunk, pending = close(pending)
+        if chunk is not None:
+            yield chunk
+    if pending is not None:
+        yield pending
 
-    return chunks_with_metadata
@@ -1,51 +1,362 @@
-from transformers import AutoTokenizer, AutoModel
-from sentence_transformers import SentenceTransformer
-import torch
+import os
+import numpy as np
+from app.embedding_cache import cached_embeddings
+from app.model_registry import registry
 
-# Load the multilingual RoBERTa model and tokenizer
+# The multilingual RoBERTa model is used for notes, literature and queries
 MULTILINGUAL_MODEL_NAME = "xlm-roberta-base"
-tokenizer = AutoTokenizer.from_pretrained(MULTILINGUAL_MODEL_NAME)
-model = AutoModel.from_pretrained(MULTILINGUAL_MODEL_NAME)
-
-# Load the all-mpnet-v2 model for sources
+# The all-mpnet-v2 model is used for sources
 ENGLISH_MODEL_NAME = "sentence-transformers/all-mpnet-base-v2"
-english_model = SentenceTransformer(ENGLISH_MODEL_NAME)
 
-# Use GPU if available
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = model.to(device)
+
+# Inference backends:
+#   torch - fp32 PyTorch (GPU if available)
+#   int8  - dynamic int8 quantization of all Linear layers, CPU only
+EMBEDDING_BACKENDS = ("torch", "int8")
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+
+
+def get_device():
+    """
+    Returns the torch device used for inference (GPU if available).
+    """
+    import torch
+    return torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+
+def _quantize(model):
+    """
+    Applies dynamic int8 quantization to the Linear layers of a model on CPU.
+    """
+    import torch
+
+    model = model.to("cpu")
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _load_multilingual_tokenizer():
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(MULTILINGUAL_MODEL_NAME)
+
+
+def _load_multilingual_model(backend="torch"):
+    from transformers import AutoModel
+
+    tokenizer = get_multilingual_tokenizer()
+    model = AutoModel.from_pretrained(MULTILINGUAL_MODEL_NAME)
+    model = _quantize(model) if backend == "int8" else model.to(get_device())
+    model.eval()
+    return tokenizer, model
+
+
+def _load_english_model(backend="torch"):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "int8":
+        return _quantize(SentenceTransformer(ENGLISH_MODEL_NAME, device="cpu"))
+    return SentenceTransformer(ENGLISH_MODEL_NAME, device=str(get_device()))
+
+
+def _model_key(model_name, backend):
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+
+def _resolve_backend(backend):
+    backend = backend or EMBEDDING_BACKEND
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{backend}'")
+    return backend
+
+
+# Models are loaded on first use, not at import time
+registry.register(f"{MULTILINGUAL_MODEL_NAME}:tokenizer", _load_multilingual_tokenizer)
+for _backend in EMBEDDING_BACKENDS:
+    registry.register(_model_key(MULTILINGUAL_MODEL_NAME, _backend), lambda b=_backend: _load_multilingual_model(b))
+    registry.register(_model_key(ENGLISH_MODEL_NAME, _backend), lambda b=_backend: _load_english_model(b))
+
+
+def get_multilingual_tokenizer():
+    """
+    Returns the shared RoBERTa-XLM tokenizer without loading the model weights.
+    """
+    return registry.get(f"{MULTILINGUAL_MODEL_NAME}:tokenizer")
+
+
+def count_tokens(texts):
+    """
+    Returns the number of RoBERTa-XLM tokens (without special tokens) of every text in a list.
+    """
+    return [len(ids) for ids in get_multilingual_tokenizer()(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+def get_multilingual_model(backend=None):
+    """
+    Returns the shared (tokenizer, model) pair of RoBERTa-XLM for a backend.
+    """
+    return registry.get(_model_key(MULTILINGUAL_MODEL_NAME, _resolve_backend(backend)))
+
+
+def get_english_model(backend=None):
+    """
+    Returns the shared all-mpnet-v2 SentenceTransformer for a backend.
+    """
+    return registry.get(_model_key(ENGLISH_MODEL_NAME, _resolve_backend(backend)))
+
+
+def use_embedding_server():
+    """
+    True if embeddings should be requested from the shared embedding server
+    (EMBEDDING_SERVER_SOCKET is set and this process is not the server itself).
+    """
+    from app import embedding_server
+    return bool(embedding_server.EMBEDDING_SERVER_SOCKET) and not embedding_server.SERVING
+
+
+def _embed_via_server(model, texts, **options):
+    """
+    Requests embeddings from the embedding server. If the server cannot be reached,
+    EmbeddingServerUnavailable is raised, unless EMBEDDING_SERVER_FALLBACK is enabled:
+    then None is returned and the caller falls back to the local models. Timeouts are
+    always raised, since the request may still be running on the server.
+    """
+    from app.embedding_server import get_client, EmbeddingServerUnavailable, LOCAL_FALLBACK
+    try:
+        return get_client().embed(model, texts, **options)
+    except EmbeddingServerUnavailable as e:
+        if not LOCAL_FALLBACK:
+            raise
+        print(f"Embedding server unavailable, embedding locally: {e}")
+        return None
+
+
+def _cache_settings(settings, backend):
+    # Quantized models produce slightly different vectors, so they are cached separately
+    return settings if backend == "torch" else f"{settings};{backend}"
+
+
+# Maximum sequence length of RoBERTa-XLM, including the special tokens
+MAX_TOKENS = 512
+# Tokens the sliding window advances for texts longer than MAX_TOKENS
+WINDOW_STRIDE = int(os.environ.get("EMBEDDING_WINDOW_STRIDE", 384))
+
+# Pooling modes of RoBERTa-XLM:
+#   cls  - CLS token of the first 512 tokens, unnormalized (the original behaviour)
+#   mean - mean over all tokens, overlong texts embedded as sliding windows, L2-normalized
+POOLING_MODES = ("cls", "mean")
+# Pooling per collection, e.g. EMBEDDING_POOLING="literature=mean,notes=mean"
+COLLECTION_POOLING = {
+    name.strip(): mode.strip()
+    for name, _, mode in (item.partition("=") for item in os.environ.get("EMBEDDING_POOLING", "").split(","))
+    if mode
+}
+DEFAULT_POOLING = "cls"
+
+# Cache keys include the settings that change the resulting vectors
+MULTILINGUAL_SETTINGS = {
+    "cls": "cls;max_length=512",
+    "mean": f"mean;l2;window={MAX_TOKENS};stride={WINDOW_STRIDE}",
+}
+ENGLISH_SETTINGS = "encode"
+
+# Texts per forward pass of RoBERTa-XLM and CPU threads used by torch (0 keeps the torch default)
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", 16))
+TORCH_NUM_THREADS = int(os.environ.get("TORCH_NUM_THREADS", 0))
+
+_threads_configured = False
+
+
+def pooling_for(collection_name):
+    """
+    Returns the pooling mode configured for a collection.
+    Changing it requires re-embedding the collection.
+    """
+    pooling = COLLECTION_POOLING.get(collection_name, DEFAULT_POOLING)
+    if pooling not in POOLING_MODES:
+        raise ValueError(f"Unknown pooling mode '{pooling}' for collection '{collection_name}'")
+    return pooling
+
+
+def _configure_threads():
+    global _threads_configured
+    if not _threads_configured:
+        import torch
+        if TORCH_NUM_THREADS > 0:
+            torch.set_num_threads(TORCH_NUM_THREADS)
+        _threads_configured = True
+
+
+def _split_into_windows(token_ids, pooling):
+    """
+    Returns the token windows to embed for one text (without special tokens).
+    In 'cls' mode the text is truncated; in 'mean' mode overlong texts are covered
+    by overlapping windows.
+    """
+    window = MAX_TOKENS - 2
+    if pooling == "cls" or len(token_ids) <= window:
+        return [token_ids[:window]]
+    starts = list(range(0, len(token_ids) - window, WINDOW_STRIDE))
+    starts.append(len(token_ids) - window)  # The last window ends with the text
+    return [token_ids[start:start + window] for start in starts]
+
+
+def _encode_multilingual(texts, batch_size=EMBEDDING_BATCH_SIZE, pooling=DEFAULT_POOLING, backend=None):
+    """
+    Runs RoBERTa-XLM on a list of texts and returns their embeddings as a float32
+    matrix in input order.
+
+    Texts are tokenized once and split into windows of at most MAX_TOKENS. All windows
+    are sorted by token length and processed in batches of neighbouring lengths, so each
+    batch is padded only to its own longest window. Window vectors are averaged per text,
+    weighted by their token count.
+    """
+    import torch
+
+    _configure_threads()
+    tokenizer, model = get_multilingual_model(backend)
+    device = get_device() if _resolve_backend(backend) == "torch" else "cpu"
+
+    # Tokenize without special tokens and padding to get the length of every text
+    token_ids = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    windows = []
+    owners = []
+    for owner, ids in enumerate(token_ids):
+        for window in _split_into_windows(ids, pooling):
+            windows.append([tokenizer.cls_token_id, *window, tokenizer.sep_token_id])
+            owners.append(owner)
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]), reverse=True)
+
+    window_embeddings = np.empty((len(windows), model.config.hidden_size), dtype=np.float32)
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            inputs = tokenizer.pad(
+                {
+                    "input_ids": [windows[i] for i in indices],
+                    "attention_mask": [[1] * len(windows[i]) for i in indices],
+                },
+                return_tensors="pt",
+            )
+            # Move inputs to the correct device (CPU or GPU)
+            inputs = {key: value.to(device) for key, value in inputs.items()}
+            hidden = model(**inputs).last_hidden_state
+            if pooling == "mean":
+                mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+            else:
+                # Extract the CLS token embedding (represents the entire input sequence)
+                pooled = hidden[:, 0, :]
+            window_embeddings[indices] = pooled.float().cpu().numpy()
+
+    if len(windows) == len(texts):
+        embeddings = window_embeddings
+    else:
+        # Aggregate the windows of overlong texts
+        embeddings = np.zeros((len(texts), model.config.hidden_size), dtype=np.float32)
+        weights = np.zeros(len(texts), dtype=np.float32)
+        for i, owner in enumerate(owners):
+            embeddings[owner] += window_embeddings[i] * len(windows[i])
+            weights[owner] += len(windows[i])
+        embeddings /= weights[:, None]
+
+    if pooling == "mean":
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings /= np.maximum(norms, 1e-12)
+    return embeddings
 
 
-def vectorize_text(text):
+def vectorize_texts(texts, batch_size=None, pooling=DEFAULT_POOLING, backend=None, stats=None):
+    """
+    Converts a list of texts into vectors using RoBERTa-XLM with the given pooling mode
+    and inference backend (EMBEDDING_BACKEND by default).
+
+    Returns a contiguous float32 matrix with one row per text. Only texts missing
+    from the embedding cache are encoded, in length-bucketed batches of `batch_size`;
+    their number is added to stats['embedded'] if `stats` is given.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    if pooling not in POOLING_MODES:
+        raise ValueError(f"Unknown pooling mode '{pooling}'")
+    batch_size = batch_size or EMBEDDING_BATCH_SIZE
+    backend = _resolve_backend(backend)
+    if use_embedding_server():
+        embeddings = _embed_via_server("multilingual", texts, pooling=pooling, backend=backend, stats=stats)
+        if embeddings is not None:
+            return embeddings
+    embeddings = cached_embeddings(
+        MULTILINGUAL_MODEL_NAME, _cache_settings(MULTILINGUAL_SETTINGS[pooling], backend), texts,
+        lambda missing: _encode_multilingual(missing, batch_size=batch_size, pooling=pooling, backend=backend),
+        stats=stats,
+    )
+    return np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
+
+
+def vectorize_text(text, pooling=DEFAULT_POOLING):
     """
     Converts a piece of text into a vector using RoBERTa-XLM.
-    Automatically uses GPU if available.
+    Automatically uses GPU if available. Embeddings of previously seen texts are
+    served from the embedding cache.
     """
     print(f"Starting vectorization with RoBERTa-XLM on: {text}")
-    # Tokenize the input text
-    inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+    embedding = vectorize_texts([text], pooling=pooling)[0]
+
+    print("Vectorization with RoBERTa-XLM completed.")
+    return embedding.tolist()  # Convert to list for JSON serialization
 
-    # Move inputs to the correct device (CPU or GPU)
-    inputs = {key: value.to(device) for key, value in inputs.items()}
 
-    # Perform a forward pass to get embeddings
-    with torch.no_grad():
-        outputs = model(**inputs)
+def _encode_english(texts, batch_size=32, backend=None):
+    """
+    Runs all-mpnet-v2 on a list of texts and returns a float32 matrix.
+    """
+    _configure_threads()
+    return get_english_model(backend).encode(list(texts), batch_size=batch_size)
 
-    # Extract the CLS token embedding (represents the entire input sequence)
-    cls_embedding = outputs.last_hidden_state[:, 0, :].squeeze().cpu().numpy()
 
-    print("Vectorization with RoBERTa-XLM completed.")
-    return cls_embedding.tolist()  # Convert to list for JSON serialization
+def _vectorize_english(texts, batch_size=32, backend=None, stats=None):
+    """
+    Returns all-mpnet-v2 embeddings of `texts` as a float32 matrix, encoding only
+    texts missing from the embedding cache (counted in stats['embedded']).
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    backend = _resolve_backend(backend)
+    if use_embedding_server():
+        embeddings = _embed_via_server("english", texts, backend=backend, stats=stats)
+        if embeddings is not None:
+            return embeddings
+    embeddings = cached_embeddings(
+        ENGLISH_MODEL_NAME, _cache_settings(ENGLISH_SETTINGS, backend), texts,
+        lambda missing: _encode_english(missing, batch_size=batch_size, backend=backend),
+        stats=stats,
+    )
+    return np.ascontiguousarray(np.vstack(embeddings), dtype=np.float32)
 
 
-def vectorize_sources(text):
+def vectorize_sources(text, backend=None):
     """
     Converts a piece of text into a vector using all-mpnet-v2 (optimized for English).
     """
     print(f"Starting vectorization with all-mpnet-v2 on: {text}")
     # Use SentenceTransformers for embedding
-    embedding = english_model.encode(text)
+    embedding = _vectorize_english([text], backend=backend)[0]
 
     print("Vectorization with all-mpnet-v2 completed.")
     return embedding.tolist()  # Convert to list for JSON serialization
+
+
+def vectorize_sources_batch(texts, batch_size=32, backend=None, stats=None):
+    """
+    Converts a list of texts into vectors using all-mpnet-v2 in batches of `batch_size`.
+    Returns one embedding list per input text; cached texts are not re-encoded, and the
+    number of encoded texts is added to stats['embedded'] if `stats` is given.
+    """
+    print(f"Starting batch vectorization with all-mpnet-v2 on {len(texts)} texts")
+    if not texts:
+        return []
+    embeddings = _vectorize_english(texts, batch_size=batch_size, backend=backend, stats=stats)
+
+    print("Batch vectorization with all-mpnet-v2 completed.")
+    return embeddings.tolist()  # Convert to list for JSON serialization
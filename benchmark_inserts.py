@@ -0,0 +1,65 @@
+import time
+import argparse
+import tempfile
+import numpy as np
+from chromadb import PersistentClient
+
+DIMENSION = 768
+
+
+def scan_exists(collection, doc_id):
+    """
+    The previous duplicate check of manage_collection: fetch everything and scan the metadata.
+    """
+    existing = collection.get(include=["documents", "metadatas"])
+    return any(meta.get("id") == doc_id for meta in existing["metadatas"])
+
+
+def lookup_exists(collection, doc_id):
+    """
+    Primary-key lookup as used by app.chroma.document_exists.
+    """
+    return bool(collection.get(ids=[doc_id], include=[])["ids"])
+
+
+def insert_latency(collection, exists, doc_id, rng, runs):
+    start = time.perf_counter()
+    for run in range(runs):
+        new_id = f"{doc_id}_{run}"
+        if not exists(collection, new_id):
+            collection.upsert(
+                ids=[new_id],
+                documents=["benchmark document " * 20],
+                metadatas=[{"id": new_id, "added_by": "benchmark"}],
+                embeddings=rng.random((1, DIMENSION)).tolist(),
+            )
+    return (time.perf_counter() - start) / runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure insert latency of manage_collection as the collection grows.")
+    parser.add_argument("--sizes", default="1000,5000,10000,20000", help="Collection sizes to measure at")
+    parser.add_argument("--runs", type=int, default=20, help="Inserts measured per size and method")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        collection = PersistentClient(path=directory).get_or_create_collection("benchmark")
+        filled = 0
+        print(f"{'size':>8} {'scan (ms)':>12} {'lookup (ms)':>12}")
+        for size in (int(value) for value in args.sizes.split(",")):
+            # Fill the collection up to the next size in bulk
+            while filled < size:
+                count = min(1000, size - filled)
+                ids = [f"doc_{filled + i}" for i in range(count)]
+                collection.add(
+                    ids=ids,
+                    documents=["benchmark document " * 20] * count,
+                    metadatas=[{"id": doc_id, "added_by": "benchmark"} for doc_id in ids],
+                    embeddings=rng.random((count, DIMENSION)).tolist(),
+                )
+                filled += count
+            scan = insert_latency(collection, scan_exists, f"scan_{size}", rng, args.runs)
+            lookup = insert_latency(collection, lookup_exists, f"lookup_{size}", rng, args.runs)
+            filled += 2 * args.runs
+            print(f"{size:>8} {scan * 1000:>12.2f} {lookup * 1000:>12.2f}")
@@ -0,0 +1,69 @@
+import time
+import argparse
+import numpy as np
+from evaluate_recall import load_corpus
+from app.vectorizer import vectorize_sources_batch, count_tokens
+from app.reranker import Reranker, RERANKER_MODEL_NAME
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def evaluate(name, rankings, queries, ids, token_counts, k, extra_seconds=0.0):
+    """
+    Prints recall@k (the relevant chapter reaches the prompt) and the prompt tokens of the k documents.
+    """
+    hits = 0
+    tokens = []
+    for query, ranking in zip(queries, rankings):
+        selected = ranking[:k]
+        hits += len({ids[i] for i in selected} & set(query["relevant"])) / len(query["relevant"])
+        tokens.append(sum(token_counts[i] for i in selected))
+    print(
+        f"{name:<28} k={k:<3} recall {hits / len(queries):.3f}  "
+        f"context tokens mean {np.mean(tokens):.0f}  "
+        f"rerank {extra_seconds / len(queries) * 1000:.1f} ms/query"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare vector top-k with cross-encoder reranking on ep.json.")
+    parser.add_argument("--file", default="ep.json", help="Chapter JSON file providing the corpus")
+    parser.add_argument("--query-language", default="english", choices=["latin", "german", "english"])
+    parser.add_argument("--queries", type=int, default=200, help="Number of held-out heading queries")
+    parser.add_argument("--candidates", type=int, default=20, help="Candidates passed to the cross-encoder")
+    parser.add_argument("--top-n", type=int, default=3, help="Documents kept after reranking")
+    parser.add_argument("--baseline-ks", default="3,5,10", help="Comma-separated k of the vector-only baseline")
+    args = parser.parse_args()
+
+    # Headings are queries, English contents (what the sources collection embeds) the documents
+    ids, documents, queries = load_corpus(args.file, "english", args.query_language)
+    queries = queries[:args.queries]
+    print(f"{len(documents)} documents, {len(queries)} queries, reranker {RERANKER_MODEL_NAME}")
+
+    document_vectors = normalize(vectorize_sources_batch(documents))
+    query_vectors = normalize(vectorize_sources_batch([query["query"] for query in queries]))
+    # Prompt size is estimated with the RoBERTa-XLM tokenizer
+    token_counts = count_tokens(documents)
+
+    rankings = np.argsort(-(query_vectors @ document_vectors.T), axis=1)[:, :max(args.candidates, 10)]
+    for k in [int(k) for k in args.baseline_ks.split(",")]:
+        evaluate("vector top-k", rankings, queries, ids, token_counts, k)
+
+    reranker = Reranker()
+    reranked = []
+    start = time.perf_counter()
+    for query, ranking in zip(queries, rankings):
+        candidates = list(ranking[:args.candidates])
+        scores = reranker.score(query["query"], [documents[i] for i in candidates])
+        reranked.append([candidates[i] for i in np.argsort(scores)[::-1]])
+    rerank_seconds = time.perf_counter() - start
+    evaluate(f"rerank top-{args.candidates}", reranked, queries, ids, token_counts, args.top_n, rerank_seconds)
+
+    # A second pass is served from the score cache
+    start = time.perf_counter()
+    for query, ranking in zip(queries, rankings):
+        reranker.score(query["query"], [documents[i] for i in ranking[:args.candidates]])
+    print(f"cached rerank {(time.perf_counter() - start) / len(queries) * 1000:.2f} ms/query")
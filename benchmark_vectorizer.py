@@ -0,0 +1,68 @@
+import json
+import time
+import argparse
+
+# The encoder is called directly, so the embedding cache does not affect the numbers
+from app.vectorizer import get_multilingual_model, _encode_multilingual
+
+
+def load_texts(path, limit):
+    """
+    Collects Latin, German and English chapter texts from a chapter JSON file.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    texts = []
+    for chapter in data.get("chapters", []):
+        for language in ("latin", "german", "english"):
+            content = chapter.get(language, {}).get("content", "")
+            if content:
+                texts.append(content)
+    return texts[:limit]
+
+
+def per_call(texts):
+    """
+    The previous path of vectorize_text: one tokenizer call and one forward pass per text.
+    """
+    import torch
+
+    tokenizer, model = get_multilingual_model()
+    device = next(model.parameters()).device
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", truncation=True, padding=True, max_length=512)
+        inputs = {key: value.to(device) for key, value in inputs.items()}
+        with torch.no_grad():
+            outputs = model(**inputs)
+        outputs.last_hidden_state[:, 0, :].squeeze().cpu().numpy().tolist()
+
+
+def measure(label, function, texts):
+    start = time.perf_counter()
+    function(texts)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(texts) / elapsed:8.1f} texts/s ({elapsed:.2f}s)")
+    return elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-call and batched RoBERTa-XLM encoding.")
+    parser.add_argument("--file", default="ep.json", help="Chapter JSON file providing the texts")
+    parser.add_argument("--limit", type=int, default=256, help="Number of texts to encode")
+    parser.add_argument("--batch-sizes", default="8,16,32", help="Comma-separated batch sizes to try")
+    args = parser.parse_args()
+
+    texts = load_texts(args.file, args.limit)
+    print(f"Encoding {len(texts)} texts from {args.file}")
+
+    # Load the model and warm up outside the measurements
+    _encode_multilingual(texts[:4], batch_size=4)
+
+    baseline = measure("per-call", per_call, texts)
+    for batch_size in (int(size) for size in args.batch_sizes.split(",")):
+        elapsed = measure(
+            f"vectorize_texts batch={batch_size}",
+            lambda items: _encode_multilingual(items, batch_size=batch_size),
+            texts,
+        )
+        print(f"{'':<28} speedup x{baseline / elapsed:.2f}")
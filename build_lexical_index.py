@@ -0,0 +1,41 @@
+import argparse
+from app.chroma import get_collection
+from app.lexical_index import get_lexical_index
+from app.document_store import get_document_store, STORED_FIELDS
+
+# Metadata fields added to the indexed text of source chapters
+SOURCE_FIELDS = ["chapter_id", "latin_heading", "latin_content", "german_content", "english_heading"]
+
+
+def rebuild(collection_name, batch_size=500):
+    """
+    Rebuilds the BM25 index of a collection from the documents stored in Chroma.
+    Lemmatized texts are only available when chapters are re-imported from JSON.
+    """
+    collection = get_collection(collection_name)
+    index = get_lexical_index()
+    index.clear(collection_name)
+
+    offset = 0
+    while True:
+        batch = collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        # Headings and contents of imported chapters are kept in the document store
+        metadatas = get_document_store().hydrate(collection_name, batch["ids"], batch["metadatas"], STORED_FIELDS)
+        texts = []
+        for document, metadata in zip(batch["documents"], metadatas):
+            metadata = metadata or {}
+            texts.append(" ".join([document or ""] + [str(metadata.get(field, "")) for field in SOURCE_FIELDS]))
+        index.add_documents(collection_name, batch["ids"], texts)
+        offset += len(batch["ids"])
+        print(f"Indexed {offset} documents of '{collection_name}'")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the BM25 index from the Chroma collections.")
+    parser.add_argument("collections", nargs="*", default=["sources", "literature", "notes"])
+    args = parser.parse_args()
+
+    for name in args.collections:
+        rebuild(name)
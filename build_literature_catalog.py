@@ -0,0 +1,49 @@
+import argparse
+from app import create_app
+from app.models import db, LiteratureDocument
+from app.chroma import get_collection
+
+
+def rebuild(batch_size=1000):
+    """
+    Rebuilds the literature catalog from the chunk metadata stored in Chroma, for PDFs
+    ingested before the catalog existed. Page counts, sizes and timings are unknown for those.
+    """
+    collection = get_collection("literature")
+    documents = {}
+    offset = 0
+    while True:
+        batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+        if not batch["ids"]:
+            break
+        for metadata in batch["metadatas"]:
+            document = documents.setdefault(metadata["document_id"], {"chunk_count": 0})
+            document.update(
+                {
+                    "author": metadata.get("author", ""),
+                    "title": metadata.get("title", ""),
+                    "year": metadata.get("year", ""),
+                    "added_by": metadata.get("added_by", ""),
+                }
+            )
+            document["chunk_count"] += 1
+        offset += len(batch["ids"])
+
+    for document_id, fields in documents.items():
+        document = LiteratureDocument.query.get(document_id) or LiteratureDocument(document_id=document_id)
+        for name, value in fields.items():
+            setattr(document, name, value)
+        # PDFs were ingested in one request before the catalog existed
+        document.complete = True
+        db.session.add(document)
+    db.session.commit()
+    print(f"Catalogued {len(documents)} documents from {offset} chunks")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the literature catalog from the Chroma collection.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Chunk metadata read per request")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        rebuild(args.batch_size)
@@ -0,0 +1,173 @@
+import sys
+import time
+import argparse
+import threading
+from fake_ollama import FakeOllamaServer
+from app.llm_gateway import LLMGateway, LLMOverloaded
+
+# Short, so queued streams report positions and notice cancellation quickly
+POLL_INTERVAL = 0.02
+
+
+
+class CheckFailed(AssertionError):
+    """
+    Raised by a check whose condition does not hold.
+    """
+
+
+def check(name, passed, detail=""):
+    if not passed:
+        raise CheckFailed(f"{name}{f' ({detail})' if detail else ''}")
+    print(f"PASS  {name}{f' ({detail})' if detail else ''}")
+
+
+def start_fake_server(port, ttft, token_delay):
+    """
+    Starts a fake Ollama server in a background thread. Returns the server and its URL.
+    """
+    server = FakeOllamaServer(("127.0.0.1", port), ttft=ttft, token_delay=token_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def run_stream(gateway, user, log, prompt="question"):
+    """
+    Streams one answer and records when its slot was granted and when it finished.
+    """
+    started = None
+    for kind, _ in gateway.stream(prompt, user):
+        if kind == "started":
+            started = time.perf_counter()
+    log.append((user, started, time.perf_counter()))
+
+
+def run_threads(targets, stagger=0.0):
+    threads = [threading.Thread(target=target) for target in targets]
+    for thread in threads:
+        thread.start()
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join()
+
+
+def check_concurrency_limit(base_url, limit):
+    gateway = LLMGateway(base_url=base_url, max_concurrency=limit, poll_interval=POLL_INTERVAL)
+    log = []
+    run_threads([lambda: run_stream(gateway, "alice", log) for _ in range(limit * 3)])
+    events = sorted([(start, 1) for _, start, _ in log] + [(end, -1) for _, _, end in log])
+    running = peak = 0
+    for _, change in events:
+        running += change
+        peak = max(peak, running)
+    stats = gateway.stats()
+    check("concurrency limit", peak <= limit and stats["completed"] == limit * 3, f"peak {peak}, limit {limit}")
+    check("connection reuse", stats["connections_created"] <= limit,
+          f"{stats['connections_created']} connections for {stats['completed']} requests")
+
+
+def check_fairness(base_url):
+    gateway = LLMGateway(base_url=base_url, max_concurrency=1, poll_interval=POLL_INTERVAL)
+    log = []
+    # alice queues six questions before bob asks two
+    targets = [lambda: run_stream(gateway, "alice", log) for _ in range(6)]
+    targets += [lambda: run_stream(gateway, "bob", log) for _ in range(2)]
+    run_threads(targets, stagger=0.01)
+    order = [user for user, _, _ in sorted(log, key=lambda entry: entry[1])]
+    last_bob = max(i for i, user in enumerate(order) if user == "bob")
+    check("per-user fairness", last_bob < len(order) - 1 and last_bob <= 4, " ".join(order))
+
+
+def check_queue_limit(base_url):
+    gateway = LLMGateway(base_url=base_url, max_concurrency=1, queue_limit=2, poll_interval=POLL_INTERVAL)
+    log = []
+    rejected = []
+
+    def request():
+        try:
+            gateway.generate("question", "alice")
+            log.append(True)
+        except LLMOverloaded:
+            rejected.append(True)
+
+    run_threads([request for _ in range(6)], stagger=0.01)
+    stats = gateway.stats()
+    check("queue limit", stats["rejected"]["queue_full"] == len(rejected) >= 1 and len(log) + len(rejected) == 6,
+          f"{len(log)} served, {stats['rejected']['queue_full']} rejected")
+
+
+def check_queue_timeout(base_url, generation_seconds):
+    gateway = LLMGateway(base_url=base_url, max_concurrency=1, queue_timeout=generation_seconds / 4,
+                         poll_interval=POLL_INTERVAL)
+    errors = []
+
+    def request():
+        try:
+            gateway.generate("question", "alice")
+        except LLMOverloaded as e:
+            errors.append(e)
+
+    run_threads([request, request], stagger=0.01)
+    stats = gateway.stats()
+    check("queue timeout", len(errors) == 1 and stats["rejected"]["queue_timeout"] == 1,
+          str(errors[0]) if errors else "")
+
+
+def check_cancellation(server, base_url):
+    gateway = LLMGateway(base_url=base_url, max_concurrency=1, poll_interval=POLL_INTERVAL)
+    # A running stream abandoned after a few tokens
+    tokens = 0
+    stream = gateway.stream("question", "alice")
+    for kind, _ in stream:
+        tokens += kind == "token"
+        if tokens == 3:
+            break
+    # A queued stream abandoned before it gets a slot, behind bob
+    blocker = threading.Thread(target=lambda: gateway.generate("question", "bob"))
+    blocker.start()
+    time.sleep(0.05)
+    waiting = gateway.stream("question", "carol")
+    kind, _ = next(waiting)
+    queued_before = gateway.stats()["queued"]
+    waiting.close()
+    stream.close()
+    blocker.join()
+    time.sleep(server.token_delay * 3)
+    stats = gateway.stats()
+    check("cancel running stream", stats["active"] == 0 and server.cancelled >= 1,
+          f"server saw {server.cancelled} cancelled responses")
+    check("cancel queued stream", kind == "queued" and queued_before == 2 and stats["queued"] == 0
+          and stats["cancelled"] == 2, f"gateway counted {stats['cancelled']} cancellations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the LLM gateway against an in-process fake Ollama server.")
+    parser.add_argument("--port", type=int, default=11436)
+    parser.add_argument("--concurrency", type=int, default=2, help="Concurrency limit to check")
+    parser.add_argument("--ttft", type=float, default=0.05, help="Fake seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Fake seconds between tokens")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_server(args.port, args.ttft, args.token_delay)
+    generation_seconds = args.ttft + args.token_delay * len(server.answer.split(" "))
+
+    checks = [
+        lambda: check_concurrency_limit(base_url, args.concurrency),
+        lambda: check_fairness(base_url),
+        lambda: check_queue_limit(base_url),
+        lambda: check_queue_timeout(base_url, generation_seconds),
+        lambda: check_cancellation(server, base_url),
+    ]
+    failures = []
+    start = time.perf_counter()
+    for run_check in checks:
+        try:
+            run_check()
+        except CheckFailed as e:
+            print(f"FAIL  {e}")
+            failures.append(e)
+    print(f"{server.requests} requests to the fake server in {time.perf_counter() - start:.1f} s")
+
+    server.shutdown()
+    server.server_close()
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,83 @@
+import json
+import time
+import argparse
+import numpy as np
+from app.model_registry import registry
+from app.vectorizer import (
+    MULTILINGUAL_MODEL_NAME,
+    ENGLISH_MODEL_NAME,
+    _encode_multilingual,
+    _encode_english,
+    _model_key,
+)
+
+
+def load_texts(path, language, limit):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    texts = [chapter.get(language, {}).get("content", "") for chapter in data.get("chapters", [])]
+    return [text for text in texts if text][:limit]
+
+
+def cosine_similarities(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+
+def query_latency(encode, query, runs):
+    """
+    Average latency of embedding a single short query, as done by search_collection.
+    """
+    encode([query])
+    start = time.perf_counter()
+    for _ in range(runs):
+        encode([query])
+    return (time.perf_counter() - start) / runs
+
+
+def compare(label, model_name, encode, texts, query, runs):
+    results = {}
+    for backend in ("torch", "int8"):
+        backend_encode = lambda items: encode(items, backend)
+        start = time.perf_counter()
+        vectors = np.asarray(backend_encode(texts), dtype=np.float32)
+        corpus_seconds = time.perf_counter() - start
+        results[backend] = {
+            "vectors": vectors,
+            "corpus_seconds": corpus_seconds,
+            "query_seconds": query_latency(backend_encode, query, runs),
+        }
+
+    similarities = cosine_similarities(results["torch"]["vectors"], results["int8"]["vectors"])
+    memory = registry.stats()["models"]
+    print(f"\n=== {label} ({len(texts)} texts) ===")
+    print(f"cosine(fp32, int8): mean {similarities.mean():.4f}, min {similarities.min():.4f}")
+    for backend in ("torch", "int8"):
+        stats = memory.get(_model_key(model_name, backend), {})
+        print(
+            f"{backend:<6} corpus {results[backend]['corpus_seconds']:.2f}s, "
+            f"query {results[backend]['query_seconds'] * 1000:.1f} ms, "
+            f"load memory {stats.get('resident_megabytes')} MB"
+        )
+    print(f"query speedup x{results['torch']['query_seconds'] / results['int8']['query_seconds']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare int8-quantized embeddings with the fp32 models.")
+    parser.add_argument("--file", default="ep.json", help="Chapter JSON file providing the corpus")
+    parser.add_argument("--limit", type=int, default=561, help="Number of chapters to embed")
+    parser.add_argument("--query", default="excommunication of a bishop", help="Query used for latency")
+    parser.add_argument("--runs", type=int, default=20, help="Repetitions of the query measurement")
+    args = parser.parse_args()
+
+    compare(
+        "xlm-roberta-base (latin)", MULTILINGUAL_MODEL_NAME,
+        lambda items, backend: _encode_multilingual(items, backend=backend),
+        load_texts(args.file, "latin", args.limit), args.query, args.runs,
+    )
+    compare(
+        "all-mpnet-base-v2 (english)", ENGLISH_MODEL_NAME,
+        lambda items, backend: _encode_english(items, backend=backend),
+        load_texts(args.file, "english", args.limit), args.query, args.runs,
+    )
@@ -0,0 +1,80 @@
+import json
+import argparse
+import numpy as np
+from app.vectorizer import vectorize_texts, POOLING_MODES
+
+
+def load_corpus(path, corpus_language, query_language):
+    """
+    Builds the corpus and a held-out query set from a chapter JSON file.
+
+    Every chapter contributes its content in `corpus_language` to the corpus. Its heading
+    in `query_language` becomes a query whose only relevant document is the chapter itself;
+    headings are not part of the embedded content.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    ids, documents, queries = [], [], []
+    for chapter in data.get("chapters", []):
+        content = chapter.get(corpus_language, {}).get("content", "")
+        if not chapter.get("id") or not content:
+            continue
+        ids.append(chapter["id"])
+        documents.append(content)
+        heading = chapter.get(query_language, {}).get("heading", "")
+        if heading:
+            queries.append({"query": heading, "relevant": [chapter["id"]]})
+    return ids, documents, queries
+
+
+def recall_at_k(ids, document_vectors, queries, query_vectors, ks):
+    """
+    Ranks documents by L2 distance (Chroma's default space) and returns recall@k for every k.
+    """
+    distances = (
+        (query_vectors ** 2).sum(axis=1)[:, None]
+        - 2 * query_vectors @ document_vectors.T
+        + (document_vectors ** 2).sum(axis=1)[None, :]
+    )
+    ranking = np.argsort(distances, axis=1)[:, :max(ks)]
+    recalls = {}
+    for k in ks:
+        total = 0.0
+        for query, ranked in zip(queries, ranking):
+            retrieved = {ids[i] for i in ranked[:k]}
+            total += len(retrieved & set(query["relevant"])) / len(query["relevant"])
+        recalls[k] = total / len(queries)
+    return recalls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure recall@k of the RoBERTa-XLM pooling modes.")
+    parser.add_argument("--file", default="ep.json", help="Chapter JSON file providing the corpus")
+    parser.add_argument("--corpus-language", default="latin", choices=["latin", "german", "english"])
+    parser.add_argument("--query-language", default="english", choices=["latin", "german", "english"])
+    parser.add_argument("--queries", help="Optional JSON list of {\"query\": ..., \"relevant\": [chapter ids]}")
+    parser.add_argument("--ks", default="1,3,5,10,20", help="Comma-separated values of k")
+    args = parser.parse_args()
+
+    ids, documents, queries = load_corpus(args.file, args.corpus_language, args.query_language)
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = json.load(f)
+    ks = [int(k) for k in args.ks.split(",")]
+    print(f"{len(documents)} documents, {len(queries)} held-out queries")
+
+    results = {}
+    for pooling in POOLING_MODES:
+        document_vectors = vectorize_texts(documents, pooling=pooling)
+        query_vectors = vectorize_texts([query["query"] for query in queries], pooling=pooling)
+        results[pooling] = recall_at_k(ids, document_vectors, queries, query_vectors, ks)
+        print(f"{pooling:<5} " + "  ".join(f"recall@{k}={results[pooling][k]:.3f}" for k in ks))
+
+    # Smallest k at which mean pooling matches the recall of CLS pooling at k=5
+    if 5 in ks:
+        target = results["cls"][5]
+        matching = [k for k in ks if results["mean"][k] >= target]
+        if matching:
+            print(f"mean pooling reaches cls recall@5 ({target:.3f}) at k={matching[0]}")
+        else:
+            print(f"mean pooling does not reach cls recall@5 ({target:.3f}) within k={max(ks)}")
@@ -0,0 +1,155 @@
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Returned token by token when no --answer is given
+DEFAULT_ANSWER = (
+    "According to the retrieved chapters, a bishop may only be excommunicated by a synod "
+    "of the province (1.1). This is a stub answer from fake_ollama.py."
+)
+
+
+def split_tokens(text):
+    """
+    Splits an answer into word-sized tokens, keeping the whitespace.
+    """
+    tokens = []
+    for i, word in enumerate(text.split(" ")):
+        tokens.append(word if i == 0 else " " + word)
+    return tokens
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """
+    Answers /api/generate like Ollama, streaming newline-delimited JSON chunks with a
+    configurable delay before the first token and between tokens.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, payload):
+        line = json.dumps(payload).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": self.server.model}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, 404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        prompt = request.get("prompt", "")
+        model = request.get("model", self.server.model)
+        tokens = split_tokens(self.server.answer)
+        self.server.requests += 1
+
+        start = time.perf_counter()
+        # Prompt evaluation: proportional to the prompt length, like a CPU-bound model
+        time.sleep(self.server.ttft + self.server.prompt_seconds_per_char * len(prompt))
+        prompt_eval = time.perf_counter() - start
+
+        if not request.get("stream", True):
+            time.sleep(self.server.token_delay * len(tokens))
+            self._send_json({
+                "model": model,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "response": "".join(tokens),
+                "done": True,
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(self.server.token_delay * len(tokens) * 1e9),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        generation_start = time.perf_counter()
+        try:
+            for token in tokens:
+                self._write_chunk({
+                    "model": model,
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "response": token,
+                    "done": False,
+                })
+                time.sleep(self.server.token_delay)
+            self._write_chunk({
+                "model": model,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "response": "",
+                "done": True,
+                "total_duration": int((time.perf_counter() - start) * 1e9),
+                "prompt_eval_count": len(prompt.split()),
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((time.perf_counter() - generation_start) * 1e9),
+            })
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the request
+            self.server.cancelled += 1
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, model="llama3.1", answer=DEFAULT_ANSWER, ttft=0.2, token_delay=0.02,
+                 prompt_seconds_per_char=0.0, verbose=False):
+        super().__init__(address, FakeOllamaHandler)
+        self.model = model
+        self.answer = answer
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.prompt_seconds_per_char = prompt_seconds_per_char
+        self.verbose = verbose
+        self.requests = 0
+        self.cancelled = 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama server streaming a fixed answer.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--model", default="llama3.1")
+    parser.add_argument("--answer", default=DEFAULT_ANSWER, help="Text returned for every prompt")
+    parser.add_argument("--ttft", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between tokens")
+    parser.add_argument("--prompt-seconds-per-char", type=float, default=0.0,
+                        help="Additional delay per prompt character, to mimic prompt evaluation")
+    parser.add_argument("--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        (args.host, args.port), model=args.model, answer=args.answer, ttft=args.ttft,
+        token_delay=args.token_delay, prompt_seconds_per_char=args.prompt_seconds_per_char, verbose=args.verbose,
+    )
+    print(f"Fake Ollama listening on http://{args.host}:{args.port} (set OLLAMA_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,20 @@
+import argparse
+import shutil
+import subprocess
+import sys
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Chroma server on ./chroma_data shared by all workers.")
+    parser.add_argument("--path", default="./chroma_data", help="Persist directory of the collections")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    executable = shutil.which("chroma")
+    if executable is None:
+        sys.exit("The 'chroma' command of the chromadb package was not found.")
+    print(f"Set CHROMA_SERVER_HOST={args.host} CHROMA_SERVER_PORT={args.port} for the web and ingestion workers")
+    try:
+        subprocess.run([executable, "run", "--path", args.path, "--host", args.host, "--port", str(args.port)], check=True)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,11 @@
+import argparse
+from app import embedding_server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the shared embedding server on a Unix socket.")
+    parser.add_argument("--socket", default=embedding_server.EMBEDDING_SERVER_SOCKET or "./embedding.sock",
+                        help="Path of the Unix socket")
+    parser.add_argument("--no-preload", action="store_true", help="Load models on the first request instead of at startup")
+    args = parser.parse_args()
+
+    embedding_server.serve(args.socket, preload=not args.no_preload)
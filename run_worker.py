@@ -0,0 +1,12 @@
+import argparse
+from app.jobs import start_workers
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background ingestion workers for uploaded PDFs.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    processes = start_workers(args.workers)
+    print(f"Started {len(processes)} ingestion worker(s)")
+    for process in processes:
+        process.join()
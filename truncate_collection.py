@@ -0,0 +1,40 @@
+import argparse
+from app.chroma import truncate_collection, TRUNCATE_MODES
+
+
+def truncate(collection_name, mode, batch_size):
+    """
+    Empties a collection, printing progress, and clears the literature catalog with it.
+    """
+    for progress in truncate_collection(collection_name, mode=mode, batch_size=batch_size):
+        if progress["done"]:
+            print(f"Done: {progress['deleted']} documents deleted from '{collection_name}'")
+        else:
+            print(f"Deleted {progress['deleted']} of {progress['total']} documents ({mode})")
+
+    if collection_name == "literature":
+        from app import create_app
+        from app.models import db, LiteratureDocument
+
+        with create_app().app_context():
+            LiteratureDocument.query.delete()
+            db.session.commit()
+
+
+def batch_size_type(value):
+    batch_size = int(value)
+    if batch_size < 1:
+        raise argparse.ArgumentTypeError(f"batch size must be at least 1, got {batch_size}")
+    return batch_size
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete all documents of Chroma collections.")
+    parser.add_argument("collections", nargs="+", choices=["sources", "literature", "notes"])
+    parser.add_argument("--mode", default="batches", choices=TRUNCATE_MODES,
+                        help="Delete in batches, or drop and recreate the collection with its metadata")
+    parser.add_argument("--batch-size", type=batch_size_type, default=1000, help="Ids deleted per request in batches mode")
+    args = parser.parse_args()
+
+    for name in args.collections:
+        truncate(name, args.mode, args.batch_size)